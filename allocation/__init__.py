@@ -0,0 +1,105 @@
+"""
+Headless calculations behind the ICB Place Based Allocation Tool.
+
+Only pandas, NumPy, pyarrow and openpyxl are needed: importing this package doesn't
+pull in streamlit, folium or st_aggrid, so dashboard.py and batch tooling
+share the same maths.
+
+    dataset = allocation.load_dataset("data/2023_2024.csv")
+    large_df = allocation.compute_places(session, dataset)
+
+where session is a session dict in the format of the session JSON download
+(see docs/json_format_primer.md). Passing a PlaceCache,
+
+    large_df = allocation.compute_places(session, dataset, cache)
+
+reuses the results of places already calculated against the same data, and
+a SessionResults kept between edits of one session only recalculates the
+places that changed. WhatIf.from_place(dataset, gps, icb) follows the indices
+of one place as single practices are added and removed.
+
+Stage timings are logged as JSON lines on the "allocation.timing" logger at
+INFO level, e.g. logging.basicConfig(level=logging.INFO) to see them.
+"""
+
+from allocation.batching import PlaceBatcher
+from allocation.cache import PlaceCache, place_key
+from allocation.calcs import (
+    aggregate,
+    aggregations,
+    assemble_places,
+    batch_indices,
+    cached_place_results,
+    compute_places,
+    get_icb_index,
+    get_icb_table,
+    get_index,
+    icb_rows,
+    index_names,
+    index_numerator,
+    metric_calcs,
+    place_results,
+    session_places,
+)
+from allocation.data import (
+    DATA_DIR,
+    ROOT_DIR,
+    Dataset,
+    DatasetPreloader,
+    build_columnar,
+    columnar_path,
+    dataset_paths,
+    file_hash,
+    load_dataset,
+    read_columnar_data,
+    read_csv_data,
+    read_data,
+    rename_columns,
+)
+from allocation.export import (
+    build_export,
+    build_parquet,
+    build_xlsx,
+    build_zip,
+    convert_df,
+    csv_download,
+    csv_headers,
+    export_formats,
+    icb_groups,
+    write_csv,
+)
+from allocation.geography import Geographies, build_geographies, geography_levels
+from allocation.hierarchy import (
+    Hierarchy,
+    build_hierarchy,
+    hierarchy_levels,
+    hierarchy_practices,
+    hierarchy_rows,
+)
+from allocation.practices import get_practice_index, practice_rows
+from allocation.preview import clamp_page, page_count, preview_page, preview_rows
+from allocation.results import SessionResults
+from allocation.sessions import (
+    SESSION_VERSION,
+    SessionError,
+    SessionReport,
+    check_session,
+    dump_session,
+    expand_session,
+    practice_code,
+    read_session,
+    resolve_session,
+    without_places,
+)
+from allocation.spatial import (
+    SpatialIndex,
+    build_spatial_index,
+    distance_km,
+    geojson_polygons,
+    nearest_practices,
+    practices_in_polygon,
+    practices_within,
+)
+from allocation.timing import StageTimer, log_stage, stage
+from allocation.whatif import WhatIf
+from allocation.years import YearStack, compare_places, dataset_year, stack_datasets
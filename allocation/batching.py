@@ -0,0 +1,122 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/batching.py
+DESCRIPTION:    Batching concurrent place calculations into one pass per dataset
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# 3rd party:
+import numpy as np
+
+# local
+from allocation.calcs import (
+    assemble_places,
+    cached_place_results,
+    icb_rows,
+    index_names,
+    place_results,
+    session_places,
+)
+from allocation.practices import practice_rows
+from allocation.sessions import SessionError
+
+
+# Calculates the sessions submitted from many threads (e.g. the requests of an HTTP server) in batches: the
+# worker thread takes every submission that arrives within max_wait of the first (up to max_places places) and
+# sums all of their places against each dataset in one place_results call, then splits the rows back into one
+# large_df per submission. datasets maps a name (e.g. the Time Period) to a loaded Dataset.
+class PlaceBatcher:
+    def __init__(self, datasets, cache=None, max_wait=0.005, max_places=20000):
+        self.datasets = datasets
+        self.cache = cache
+        self.max_wait = max_wait
+        self.max_places = max_places
+        self.submissions = queue.Queue()
+        # batches calculated and submissions in them, for monitoring
+        self.batches = 0
+        self.batched = 0
+        self.worker = threading.Thread(target=self.run, name="place-batcher", daemon=True)
+        self.worker.start()
+
+    # Future of the large_df of a session dict against one dataset. Sessions with ICBs that aren't in the
+    # dataset are refused here, so one bad request can't fail the rest of its batch.
+    def submit(self, session, dataset_name):
+        dataset = self.datasets.get(dataset_name)
+        if dataset is None:
+            raise SessionError(f"no dataset {dataset_name}")
+        places = session_places(session)
+        unknown = sorted({icb for _, _, icb in places} - set(dataset.icb_table.index))
+        if unknown:
+            raise SessionError(f"ICBs not in {dataset_name}: {', '.join(unknown)}")
+        # practices are looked up here, in the submitting thread, so the worker only does the sums
+        rows = [practice_rows(dataset.practice_index, gps) for _, gps, _ in places]
+        future = Future()
+        self.submissions.put((dataset_name, places, rows, future))
+        return future
+
+    def run(self):
+        while True:
+            batch = [self.submissions.get()]
+            n_places = len(batch[0][1])
+            deadline = time.perf_counter() + self.max_wait
+            while n_places < self.max_places:
+                try:
+                    batch.append(self.submissions.get(timeout=max(0, deadline - time.perf_counter())))
+                except queue.Empty:
+                    break
+                n_places += len(batch[-1][1])
+            by_dataset = {}
+            for submission in batch:
+                by_dataset.setdefault(submission[0], []).append(submission)
+            for dataset_name, submissions in by_dataset.items():
+                try:
+                    self.calculate(self.datasets[dataset_name], submissions)
+                except Exception:
+                    # the batch is calculated again one submission at a time, so an error is only handed to the
+                    # submission it came from
+                    for submission in submissions:
+                        if submission[3].done():
+                            continue
+                        try:
+                            self.calculate(self.datasets[dataset_name], [submission])
+                        except Exception as e:
+                            submission[3].set_exception(e)
+            self.batches += 1
+            self.batched += len(batch)
+
+    # Every place of every submission summed in one pass, then assembled per submission
+    def calculate(self, dataset, submissions):
+        places = [place for _, submission_places, _, _ in submissions for place in submission_places]
+        rows = [place_rows for _, _, submission_rows, _ in submissions for place_rows in submission_rows]
+        icb_index_rows = dataset.icb_table[index_names].to_numpy()[icb_rows(dataset.icb_table, places)]
+        if self.cache is None:
+            sums, index = place_results(rows, dataset.practice_index["weights"], icb_index_rows)
+        else:
+            sums, index = cached_place_results(
+                self.cache, dataset.content_hash, dataset.practice_index, places, rows, icb_index_rows
+            )
+        has_rows = np.array([len(place_rows) > 0 for place_rows in rows], dtype=bool)
+        start = 0
+        for _, submission_places, _, future in submissions:
+            end = start + len(submission_places)
+            future.set_result(
+                assemble_places(
+                    submission_places, has_rows[start:end], sums[start:end], index[start:end], dataset.icb_table
+                )
+            )
+            start = end
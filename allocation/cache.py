@@ -0,0 +1,93 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/cache.py
+DESCRIPTION:    Bounded LRU cache of per-place results, shared between sessions
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import sys
+import threading
+from collections import OrderedDict
+
+
+# Per-place sums and indices keyed by (dataset content hash, practice rows, ICB name), see place_key.
+# Least recently used entries are evicted once the (approximate) size of the entries passes max_bytes.
+# Safe to share between threads, i.e. between the sessions of one Streamlit server.
+class PlaceCache:
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # value is a tuple of NumPy arrays
+    def put(self, key, value):
+        size = entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# A place is the same place whatever it is called or however its practices were picked. rows are the sorted
+# positions of its practices in the dataset (see allocation.practices.practice_rows), which the content hash pins
+# down, so the key reuses the lookup the calculation needs anyway rather than going back to practice codes.
+def place_key(content_hash, rows, icb):
+    return content_hash, tuple(rows), icb
+
+
+# The key tuples, row numbers and arrays held for an entry. Strings in the key are shared with the dataset so
+# aren't counted.
+def entry_size(key, value):
+    return (
+        sys.getsizeof(key)
+        + sys.getsizeof(key[1])
+        + sum(sys.getsizeof(row) for row in key[1])
+        + sum(sys.getsizeof(array) for array in value)
+    )
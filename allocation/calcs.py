@@ -0,0 +1,239 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/calcs.py
+DESCRIPTION:    Place and ICB aggregation and need index calculations
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import itertools
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+# local
+from allocation.cache import place_key
+from allocation.practices import practice_rows
+
+# Constants
+# -------------------------------------------------------------------------
+aggregations = {
+    "GP pop": "sum",
+    "Weighted G&A pop": "sum",
+    "Weighted Community pop": "sum",
+    "Weighted Mental Health pop": "sum",
+    "Weighted Maternity pop": "sum",
+    "Weighted Prescribing pop": "sum",
+    "Overall Weighted pop": "sum",
+    "Weighted Primary Care": "sum",
+    "Weighted Primary Medical Care Need": "sum",
+    "Weighted Health Inequalities pop": "sum",
+}
+
+index_numerator = [
+    "Weighted G&A pop",
+    "Weighted Community pop",
+    "Weighted Mental Health pop",
+    "Weighted Maternity pop",
+    "Weighted Prescribing pop",
+    "Overall Weighted pop",
+    "Weighted Primary Care",
+    "Weighted Primary Medical Care Need",
+    "Weighted Health Inequalities pop",
+]
+
+index_names = [
+    "G&A Index",
+    "Community Index",
+    "Mental Health Index",
+    "Maternity Index",
+    "Prescribing Index",
+    "Overall Core Index",
+    "Primary Medical Care Index",
+    "Primary Medical Care Need Index",
+    "Health Inequalities Index",
+    
+]
+
+
+# Functions
+# -------------------------------------------------------------------------
+# aggregate a set of rows and set of aggregations
+#Name is the name of the place in the session state, 'aggregations' tells it how to sum each column, 'on' is what to group it by. If the rows don't already have an 'on' column it is added, filled with name.
+#Rows are positions in data, resolved from the session state place list through the practice index (see allocation.practices.practice_rows)
+# Function outputs filtered data and grouped, filtered data separately
+def aggregate(data, rows, name, on, aggregations):
+    df = data.iloc[rows]
+    if on not in df.columns:
+        df.insert(loc=0, column=on, value=name)
+    df_group = df.groupby(on, observed=True).agg(aggregations)
+    df_group = df_group.round(0).astype(int)
+    return df, df_group
+
+
+#Calculate index of weighted populations. Take the groupby output fromn the aggregator and divides it by the population number. Do it by icb and place. 
+#get_index(place_groupby, icb_groupby, index_names, index_numerator)
+#place index is divided by icb index to get a relative number
+#overall index is final_wp / gp pop
+#icb_indices must already carry its own indices, see get_icb_index
+def get_index(place_indices, icb_indices, index_names, index_numerator):
+    place_indices[index_names] = (
+        place_indices[index_numerator]
+        .div(place_indices["GP pop"].values, axis=0)
+        .div(icb_indices[index_names].values, axis=0)
+    )
+    return place_indices, icb_indices
+
+
+#ICB index is relative to national need: icb_wp / icb gp pop
+def get_icb_index(icb_indices, index_names, index_numerator):
+    icb_indices[index_names] = icb_indices[index_numerator].div(
+        icb_indices["GP pop"].values, axis=0
+    )
+    return icb_indices
+
+
+#ICB totals and indices for every ICB in a dataset, in one groupby.
+#They never change within a dataset, so the table is built once per dataset (see load_dataset) and shared.
+def get_icb_table(data):
+    icb_groupby = data.groupby("ICB name", observed=True).agg(aggregations)
+    icb_groupby = icb_groupby.round(0).astype(int)
+    return get_icb_index(icb_groupby, index_names, index_numerator)
+
+
+#Sums and indices of places given as lists of practice rows, against each place's ICB index row (icb_index_rows).
+#The place x practice membership matrix is held CSR style (indptr / indices into the practice index), so summing each
+#row's practice weights is the sparse product membership @ weights.
+def place_results(place_rows, weights, icb_index_rows):
+    lengths = np.array([len(rows) for rows in place_rows], dtype=np.intp)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = np.fromiter(
+        itertools.chain.from_iterable(place_rows), dtype=np.intp, count=indptr[-1]
+    )
+    has_rows = lengths > 0
+
+    sums = np.zeros((len(place_rows), weights.shape[1]))
+    if has_rows.any():
+        sums[has_rows] = np.add.reduceat(weights[indices], indptr[:-1][has_rows], axis=0)
+    place_sums = sums.round(0).astype(int)
+
+    # the same divisions as get_index. Places without practices have no index (NaN) rather than dividing 0 by 0;
+    # they are left out of large_df (see assemble_places)
+    gp_pop = list(aggregations).index("GP pop")
+    numerator = [list(aggregations).index(column) for column in index_numerator]
+    place_index = np.full((len(place_rows), len(index_numerator)), np.nan)
+    place_index[has_rows] = (
+        place_sums[has_rows][:, numerator] / place_sums[has_rows][:, [gp_pop]] / icb_index_rows[has_rows]
+    )
+    return place_sums, place_index
+
+
+#place_results through a PlaceCache: only places whose (dataset, practices, ICB) isn't cached are summed
+def cached_place_results(cache, content_hash, practice_index, places, place_rows, icb_index_rows):
+    keys = [place_key(content_hash, rows, icb) for (_, _, icb), rows in zip(places, place_rows)]
+    place_sums = np.zeros((len(places), practice_index["weights"].shape[1]), dtype=int)
+    place_index = np.zeros((len(places), len(index_names)))
+    missed = []
+    for position, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is None:
+            missed.append(position)
+        else:
+            place_sums[position], place_index[position] = cached
+    if missed:
+        place_sums[missed], place_index[missed] = place_results(
+            [place_rows[position] for position in missed],
+            practice_index["weights"],
+            icb_index_rows[missed],
+        )
+        for position in missed:
+            cache.put(keys[position], (place_sums[position].copy(), place_index[position].copy()))
+    return place_sums, place_index
+
+
+#Aggregate and index every place in one pass (the batch equivalent of aggregate + get_index for each place).
+#places is a list of (place name, practices, icb name). With a PlaceCache (and the dataset's content hash) places
+#already calculated for this dataset, by any session, are taken from the cache.
+#Output matches the per-place loop: ICBs in order of first use, each ICB row followed by its places, places with no
+#practices in the dataset left out.
+def batch_indices(places, practice_index, icb_table, cache=None, content_hash=None):
+    place_rows = [practice_rows(practice_index, gps) for _, gps, _ in places]
+    icb_index_rows = icb_table[index_names].to_numpy()[icb_rows(icb_table, places)]
+    if cache is None:
+        place_sums, place_index = place_results(place_rows, practice_index["weights"], icb_index_rows)
+    else:
+        place_sums, place_index = cached_place_results(
+            cache, content_hash, practice_index, places, place_rows, icb_index_rows
+        )
+    has_rows = np.array([len(rows) > 0 for rows in place_rows], dtype=bool)
+    return assemble_places(places, has_rows, place_sums, place_index, icb_table)
+
+
+#Row position in icb_table of each place's ICB
+def icb_rows(icb_table, places):
+    icb_position = {icb: position for position, icb in enumerate(icb_table.index)}
+    return np.array([icb_position[icb] for _, _, icb in places], dtype=np.intp)
+
+
+#large_df from the sums and indices of each place (see place_results): ICBs in order of first use, each ICB row
+#followed by its places in session order. Places without practices in the dataset (has_rows False) are left out.
+def assemble_places(places, has_rows, place_sums, place_index, icb_table):
+    place_icb_rows = icb_rows(icb_table, places)
+    icb_sums = icb_table[list(aggregations)].to_numpy()
+    icb_index = icb_table[index_names].to_numpy()
+
+    icb_order = np.array(list(dict.fromkeys(place_icb_rows)), dtype=np.intp)
+    group_of = {icb: group for group, icb in enumerate(icb_order)}
+    group = np.concatenate(
+        [np.arange(len(icb_order)), [group_of[icb] for icb in place_icb_rows[has_rows]]]
+    )
+    order = np.lexsort((np.arange(len(group)), group))
+    names = np.array(
+        [icb_table.index[icb] for icb in icb_order]
+        + [place for (place, _, _), keep in zip(places, has_rows) if keep],
+        dtype=object,
+    )
+    all_sums = np.concatenate([icb_sums[icb_order], place_sums[has_rows]])[order]
+    all_index = np.concatenate([icb_index[icb_order], place_index[has_rows]])[order]
+
+    large_df = pd.DataFrame(
+        {
+            "Place / ICB": names[order],
+            **dict(zip(aggregations, all_sums.T)),
+            **dict(zip(index_names, all_index.T)),
+        }
+    )
+    return large_df.round(decimals=3)
+
+
+#(place name, practices, icb name) for every place in a session dict (the format of the session JSON download)
+def session_places(session):
+    return [(place, session[place]["gps"], session[place]["icb"]) for place in session["places"]]
+
+
+#large_df for every place in a session dict against a loaded dataset, optionally through a PlaceCache
+def compute_places(session, dataset, cache=None):
+    return batch_indices(
+        session_places(session),
+        dataset.practice_index,
+        dataset.icb_table,
+        cache=cache,
+        content_hash=dataset.content_hash,
+    )
+
+
+#Metric calcs. 
+def metric_calcs(group_need_indices, metric_index):
+    place_metric = round(group_need_indices[metric_index][0].astype(float), 2)
+    icb_metric = round(place_metric - 1, 2)
+    return place_metric, icb_metric
@@ -0,0 +1,278 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/data.py
+DESCRIPTION:    Dataset loading and lookup structures for the allocation calculations
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+# local
+from allocation.calcs import aggregations, get_icb_table
+from allocation.geography import Geographies, build_geographies
+from allocation.hierarchy import Hierarchy, build_hierarchy
+from allocation.practices import get_practice_index
+from allocation.spatial import SpatialIndex, build_spatial_index
+from allocation.timing import stage
+
+# The repository (the directory above this package) and its data/, so the scripts and the dashboard find the
+# datasets from any working directory
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+
+# Column names in the published CSVs mapped to the names used throughout the tool
+rename_columns = {
+    "Practice_Code": "GP Practice code",
+    "GP_Practice_Name": "GP Practice name",
+    "Practice_Postcode": "GP Practice postcode",
+    "CCG21": "CCG code",
+    "Former CCG": "CCG name",
+    "PCN_Code": "PCN code",
+    "PCN_Name": "PCN name",
+    "LOC22": "Location code",
+    "LOC22name": "Location name",
+    "ICS22": "ICB code",
+    "ICS22name": "ICB name",
+    "R22": "Region code",
+    "Region22": "Region name",
+    "LAD21": "LA District code",
+    "LTLA21": "LA District name",
+    "LA21": "LA code",
+    "UTLA21": "LA name",
+    "Patients": "Registered Patients",
+    "pop 2022/23": "GP pop",
+    "G&A WP": "Weighted G&A pop",
+    "CS WP": "Weighted Community pop",
+    "MH WP": "Weighted Mental Health pop",
+    "Mat WP": "Weighted Maternity pop",
+    "Health Ineq WP": "Weighted Health Inequalities pop",
+    "Prescr WP": "Weighted Prescribing pop",
+    "Final WP": "Overall Weighted pop",
+    "Primary Medical Care WP": "Weighted Primary Medical Care Need",
+    "Final PMC WP": "Weighted Primary Care",
+}
+
+# Repeated geography labels are stored as categoricals in the columnar files
+geography_columns = [
+    "CCG code",
+    "CCG name",
+    "PCN code",
+    "PCN name",
+    "Location code",
+    "Location name",
+    "ICB code",
+    "ICB name",
+    "Region code",
+    "Region name",
+    "LA District code",
+    "LA District name",
+    "LA code",
+    "LA name",
+]
+
+# Bump when the cleaning in read_csv_data changes so existing columnar files are rebuilt
+COLUMNAR_VERSION = "1"
+
+
+# Paths of the dataset CSVs in a directory (default data/), in name order
+def dataset_paths(data_dir=DATA_DIR):
+    return [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir)) if name.endswith(".csv")]
+
+
+# Parse and clean a published CSV
+def read_csv_data(path):
+    df = pd.read_csv(path)
+    df = df.rename(columns=rename_columns)
+    df = df.fillna(1).replace(0, 1)
+    df["practice_display"] = df["GP Practice code"] + ": " + df["GP Practice name"]
+    df[geography_columns] = df[geography_columns].astype("category")
+    return df
+
+
+# Columnar copy of a dataset sits next to its CSV, e.g. data/2023_2024.feather
+def columnar_path(path):
+    return os.path.splitext(path)[0] + ".feather"
+
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+# Build step: write the cleaned dataset as an uncompressed (memory-mappable) Feather file.
+# The hash of the source CSV is stored in the schema metadata to detect stale files.
+def build_columnar(path):
+    df = read_csv_data(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **table.schema.metadata,
+            b"source_sha256": file_hash(path).encode(),
+            b"columnar_version": COLUMNAR_VERSION.encode(),
+        }
+    )
+    feather.write_feather(table, columnar_path(path), compression="uncompressed")
+    return df
+
+
+# Returns None when the columnar file is missing or was built from a different CSV
+def read_columnar_data(path):
+    dest = columnar_path(path)
+    if not os.path.exists(dest):
+        return None
+    table = feather.read_table(dest, memory_map=True)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"columnar_version") != COLUMNAR_VERSION.encode():
+        return None
+    if os.path.exists(path) and metadata.get(b"source_sha256") != file_hash(path).encode():
+        return None
+    return frame_from_table(table)
+
+
+# Data frame over a memory-mapped table without copying it: with one block per column, the numeric columns and the
+# codes of the categorical columns are numpy views of the mapped file (text columns are still made into objects)
+def frame_from_table(table):
+    return table.to_pandas(split_blocks=True, self_destruct=False)
+
+
+# Columnar copy if it is up to date, otherwise parse the CSV (and write the columnar copy when we can)
+def read_data(path):
+    with stage("read data", dataset=os.path.basename(path)) as fields:
+        df = read_columnar_data(path)
+        fields["cache"] = "miss" if df is None else "hit"
+        if df is None:
+            try:
+                # read back from the file just written, so the data is memory-mapped as on every later load
+                build_columnar(path)
+                df = read_columnar_data(path)
+            except OSError:
+                # read-only deployment, serve straight from the CSV
+                df = read_csv_data(path)
+        fields["practices"] = len(df)
+    return df
+
+
+# Arrays behind a frame (including the codes of categorical columns) marked read only, so writing values into the
+# shared data (e.g. data.iloc[0, 1] = 2) raises instead of changing it for every session. This reaches into the
+# pandas block manager, so it is a guard rather than a guarantee: assigning a whole column (data["GP pop"] = 1)
+# still replaces that column in the shared frame.
+def freeze_frame(df):
+    manager = getattr(df, "_mgr", None)
+    for block in getattr(manager, "blocks", ()):
+        values = getattr(block.values, "_ndarray", block.values)
+        if isinstance(values, np.ndarray):
+            values.flags.writeable = False
+    return df
+
+
+def freeze_arrays(arrays):
+    for array in arrays:
+        array.flags.writeable = False
+
+
+# A loaded dataset with the lookup structures built from it. One per process, shared between sessions without
+# copying, so its arrays are read only: take a copy to change anything. The frames (data, icb_table and
+# geographies.table) can't be fully protected (see freeze_frame), so the dashboard doesn't use data directly, only
+# the arrays and lookups built from it (practice_index, hierarchy, spatial_index).
+@dataclass(frozen=True)
+class Dataset:
+    path: str
+    data: pd.DataFrame
+    practice_index: dict
+    icb_table: pd.DataFrame
+    content_hash: str
+    spatial_index: SpatialIndex
+    hierarchy: Hierarchy
+    geographies: Geographies
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+
+def load_dataset(path):
+    data = freeze_frame(read_data(path))
+    practice_index = get_practice_index(data, tuple(aggregations))
+    spatial_index = build_spatial_index(practice_index["lat_long"])
+    hierarchy = build_hierarchy(data)
+    icb_table = freeze_frame(get_icb_table(data))
+    geographies = build_geographies(data, icb_table)
+    freeze_frame(geographies.table)
+    freeze_arrays(
+        [practice_index["codes"], practice_index["lat_long"], practice_index["weights"]]
+        + [spatial_index.lat_long, spatial_index.origin, spatial_index.order, spatial_index.cell_start]
+        + [hierarchy.display, *hierarchy.rows.values()]
+        + [rows for level in hierarchy.members.values() for rows in level.values()]
+        + [rows for _, rows in geographies.rows.values()]
+    )
+    return Dataset(
+        path=path,
+        data=data,
+        practice_index=practice_index,
+        icb_table=icb_table,
+        # identifies the data, not the file name, e.g. for the PlaceCache
+        content_hash=file_hash(path if os.path.exists(path) else columnar_path(path)),
+        spatial_index=spatial_index,
+        hierarchy=hierarchy,
+        geographies=geographies,
+    )
+
+
+# Loads datasets one after another on a background thread (e.g. every file in data/ when the app starts), and keeps
+# each load, so every caller asking for a dataset waits for the one load already under way (or done) rather than
+# starting its own: Streamlit's singleton cache doesn't hold a lock while it calls the function, so two sessions
+# asking at once would otherwise both load it. A dataset that wasn't preloaded is loaded by its first caller.
+class DatasetPreloader:
+    def __init__(self, paths):
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dataset-preload")
+        self.lock = threading.Lock()
+        self.loads = {path: executor.submit(load_dataset, path) for path in paths}
+        executor.shutdown(wait=False)
+
+    def preloaded(self, path):
+        with self.lock:
+            return path in self.loads
+
+    # The dataset at path, from the load under way or done if there is one (waiting for it to finish), otherwise
+    # loaded now. A failed load isn't kept, so the next caller tries again.
+    def get(self, path):
+        with self.lock:
+            load = self.loads.get(path)
+            first = load is None
+            if first:
+                load = self.loads[path] = Future()
+        if first:
+            try:
+                load.set_result(load_dataset(path))
+            except Exception as e:
+                load.set_exception(e)
+        try:
+            return load.result()
+        except Exception:
+            with self.lock:
+                if self.loads.get(path) is load:
+                    del self.loads[path]
+            raise
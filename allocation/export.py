@@ -0,0 +1,157 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/export.py
+DESCRIPTION:    ZIP (CSV), Excel and Parquet downloads of the place calculations
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import io
+import os
+import re
+import zipfile
+
+# 3rd party:
+import pandas as pd
+import pyarrow as pa
+from pyarrow import parquet
+
+# local
+from allocation.data import ROOT_DIR
+
+# Lines written above the results in the downloaded CSV
+csv_headers = [
+    b"\"PLEASE READ: Below you can find the results for the places you created, and for the ICB they belong to, for the year you selected.\"",
+    b"\"Note that the need indices for the places are relative to the ICB (where the ICBs need index = 1.00), while the need index for the ICB is relative to national need (where the national need index = 1.00).\"",
+    b"\"This means that the need indices of the individual places cannot be compared to the need index of the ICB. For more information, see the user guide available from https://www.england.nhs.uk/allocations/.\"",
+    b"\"\"",
+]
+
+# in the repository's docs/
+documentation_path = os.path.join(ROOT_DIR, "docs", "ICB allocation tool documentation.txt")
+
+# Download format -> (file extension, MIME type)
+export_formats = {
+    "ZIP (CSV)": ("zip", "application/zip"),
+    "Excel (one sheet per ICB)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+# Download functionality
+def convert_df(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+# CSV download with the explanatory header lines
+def csv_download(df, headers=csv_headers):
+    return b"\n".join(headers + [convert_df(df)])
+
+
+# csv_download written straight into a binary file, without building the CSV in memory first
+def write_csv(fh, df, headers=csv_headers):
+    fh.write(b"\n".join(headers + [b""]))
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    df.to_csv(text, index=False)
+    text.flush()
+    text.detach()
+
+
+# ZIP of (file name, data) pairs. data is bytes, a str, or a function that writes the file to a binary file
+# object (e.g. lambda fh: write_csv(fh, df)), so large files are streamed into the archive.
+# https://stackoverflow.com/a/44946732
+def build_zip(files):
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
+        for file_name, data in files:
+            if callable(data):
+                with zip_file.open(file_name, "w") as fh:
+                    data(fh)
+            else:
+                zip_file.writestr(file_name, data)
+    return zip_buffer.getvalue()
+
+
+# large_df split into one frame per ICB (the ICB row and its places), as (ICB name, frame) pairs
+def icb_groups(large_df, icbs):
+    starts = [row for row, name in enumerate(large_df["Place / ICB"]) if name in icbs]
+    return [
+        (large_df["Place / ICB"].iat[start], large_df.iloc[start:end])
+        for start, end in zip(starts, starts[1:] + [len(large_df)])
+    ]
+
+
+# Excel sheet names are at most 31 characters, without []:*?/\ and unique ignoring case
+def sheet_name(name, used):
+    name = re.sub(r"[\[\]:*?/\\]", "", name)[:31]
+    base, number = name, 1
+    while name.lower() in used:
+        number += 1
+        name = f"{base[:31 - len(str(number)) - 1]} {number}"
+    used.add(name.lower())
+    return name
+
+
+# Workbook with the explanatory notes, one sheet per ICB (from icb_groups) and, when given, the time period
+# comparison. Written in openpyxl's write-only (constant memory) mode. openpyxl is only imported when a workbook
+# is built, as it is slow to import.
+def build_xlsx(large_df, icbs, comparison_df=None, headers=csv_headers):
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    used = set()
+    notes = workbook.create_sheet(sheet_name("Read me", used))
+    for line in headers:
+        notes.append([line.decode("utf-8").strip('"')])
+    sheets = icb_groups(large_df, icbs)
+    if comparison_df is not None:
+        sheets.append(("All time periods", comparison_df))
+    for name, df in sheets:
+        sheet = workbook.create_sheet(sheet_name(name, used))
+        sheet.append(list(df.columns))
+        for row in df.itertuples(index=False):
+            sheet.append([None if pd.isna(value) else value for value in row])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def build_parquet(df):
+    sink = pa.BufferOutputStream()
+    parquet.write_table(pa.Table.from_pandas(df, preserve_index=False), sink)
+    return sink.getvalue().to_pybytes()
+
+
+# The download for one of export_formats. dataset_name names the calculations CSV in the ZIP,
+# icbs are the ICB names (to find the ICB rows in large_df for the Excel sheets).
+def build_export(export_format, large_df, icbs, dataset_name, session_dump, comparison_df=None):
+    extension, _ = export_formats[export_format]
+    if extension == "xlsx":
+        return build_xlsx(large_df, icbs, comparison_df)
+    if extension == "parquet":
+        return build_parquet(large_df)
+
+    with open(documentation_path, "rb") as fh:
+        readme_text = fh.read()
+    files = [
+        (f"ICB allocation calculations {dataset_name}", lambda fh: write_csv(fh, large_df)),
+        ("ICB allocation tool documentation.txt", readme_text),
+        ("ICB allocation tool configuration file.json", session_dump),
+    ]
+    if comparison_df is not None:
+        files.append(
+            (
+                "ICB allocation calculations all time periods.csv",
+                lambda fh: write_csv(fh, comparison_df, csv_headers[1:]),
+            )
+        )
+    return build_zip(files)
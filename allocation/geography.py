@@ -0,0 +1,117 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/geography.py
+DESCRIPTION:    Built-in places: every PCN, Location, former CCG and LA District, calculated nationally
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+# local
+from allocation.calcs import aggregations, index_names, index_numerator
+from allocation.practices import column_stack
+
+# Built-in place levels, mapped to their code and name columns
+geography_levels = {
+    "PCN": ("PCN code", "PCN name"),
+    "Location": ("Location code", "Location name"),
+    "Former CCG": ("CCG code", "CCG name"),
+    "LA District": ("LA District code", "LA District name"),
+}
+
+
+# Built once per dataset. table has one row per area and ICB (an area crossing ICB boundaries has a row for the
+# part in each ICB) with its weighted population sums and indices relative to that ICB, ordered by level, ICB and
+# name. options maps a level and an ICB to the labels ("code: name") of its areas, and rows maps
+# (level, ICB, label) to the area's position in table and its practice rows. Blank codes (filled with 1 when the
+# data is read, e.g. PCN and Location in the 2023/24 data) are left out, so a level can have no areas.
+@dataclass(frozen=True)
+class Geographies:
+    table: pd.DataFrame
+    options: dict
+    rows: dict
+
+
+# Whether each value of a (categorical) column is text, checked once per category (missing values, code -1, aren't)
+def is_text(column):
+    column = column.astype("category")
+    text = np.array([isinstance(value, str) for value in column.cat.categories] + [False], dtype=bool)
+    return text[column.cat.codes.to_numpy()]
+
+
+# Every level in one groupby: the (level, ICB, code) key of each practice at each level is stacked into one long
+# frame, so the sums of every area in the country come from a single grouped sum
+def build_geographies(data, icb_table):
+    keys = []
+    for level, (code_column, name_column) in geography_levels.items():
+        has_code = is_text(data[code_column])
+        rows = np.flatnonzero(has_code)
+        codes = data[code_column].to_numpy(dtype=object)[rows]
+        names = data[name_column].to_numpy(dtype=object)[rows]
+        keys.append(
+            pd.DataFrame(
+                {
+                    "Level": level,
+                    "Code": codes,
+                    "Name": np.where(is_text(data[name_column])[rows], names, codes),
+                    "ICB name": data["ICB name"].to_numpy(dtype=object)[rows],
+                    "row": rows,
+                }
+            )
+        )
+    long = pd.concat(keys, ignore_index=True)
+    weights = column_stack(data, aggregations)[long["row"].to_numpy()]
+    long = pd.concat([long, pd.DataFrame(weights, columns=list(aggregations))], axis=1)
+
+    grouped = long.groupby(["Level", "ICB name", "Code"], sort=False)
+    sums = grouped[list(aggregations)].sum().round(0).astype(int)
+    first = grouped[["Name"]].first()
+    members = grouped.indices
+
+    areas = sums.index.to_frame(index=False)
+    areas["Name"] = first["Name"].to_numpy()
+    areas["Level"] = pd.Categorical(areas["Level"], categories=list(geography_levels), ordered=True)
+    order = np.lexsort((areas["Code"], areas["Name"], areas["ICB name"], areas["Level"].cat.codes))
+
+    area_sums = sums.to_numpy()[order]
+    areas = areas.iloc[order].reset_index(drop=True)
+    icb_index = icb_table.loc[areas["ICB name"], index_names].to_numpy()
+    gp_pop = list(aggregations).index("GP pop")
+    numerator = [list(aggregations).index(column) for column in index_numerator]
+    area_index = area_sums[:, numerator] / area_sums[:, [gp_pop]] / icb_index
+
+    labels = (areas["Code"] + ": " + areas["Name"]).to_numpy(dtype=object)
+    table = pd.DataFrame(
+        {
+            "Level": areas["Level"].astype(str).to_numpy(),
+            "Code": areas["Code"].to_numpy(),
+            "Place / ICB": areas["Name"].to_numpy(),
+            "ICB name": areas["ICB name"].to_numpy(),
+            **dict(zip(aggregations, area_sums.T)),
+            **dict(zip(index_names, area_index.T)),
+        }
+    ).round(decimals=3)
+
+    long_rows = long["row"].to_numpy()
+    options = {level: {} for level in geography_levels}
+    rows = {}
+    for position, (level, icb, code, label) in enumerate(
+        zip(table["Level"], table["ICB name"], table["Code"], labels)
+    ):
+        options[level].setdefault(icb, []).append(label)
+        rows[level, icb, label] = (position, np.sort(long_rows[members[level, icb, code]]))
+    return Geographies(table=table, options=options, rows=rows)
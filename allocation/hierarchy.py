@@ -0,0 +1,80 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/hierarchy.py
+DESCRIPTION:    ICB -> LA District / PCN / Location -> practice lookups for the sidebar filters
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+
+# Filter levels below ICB, mapped to the column they filter on
+hierarchy_levels = {
+    "LA District": "LA District name",
+    "PCN": "PCN name",
+    "Location": "Location name",
+}
+
+
+# Built once per dataset. rows maps an ICB to its practice rows, options maps a level and an ICB to the sorted
+# names in that ICB, and members maps a level and (ICB, name) to the practice rows with that name. Rows are
+# in dataset order. Blank names (filled with 1 when the data is read, e.g. PCN and Location in the 2023/24 data)
+# are left out, so a level can have no options for an ICB.
+@dataclass(frozen=True)
+class Hierarchy:
+    icbs: list
+    display: np.ndarray
+    rows: dict
+    options: dict
+    members: dict
+
+
+def build_hierarchy(data):
+    rows = data.groupby("ICB name", observed=True).indices
+    options = {}
+    members = {}
+    for level, column in hierarchy_levels.items():
+        groups = {
+            key: group
+            for key, group in data.groupby(["ICB name", column], observed=True).indices.items()
+            if isinstance(key[1], str)
+        }
+        members[level] = groups
+        options[level] = {}
+        for icb, name in sorted(groups):
+            options[level].setdefault(icb, []).append(name)
+    return Hierarchy(
+        icbs=sorted(rows),
+        display=data["practice_display"].to_numpy(),
+        rows=rows,
+        options=options,
+        members=members,
+    )
+
+
+# Practice rows in an ICB, narrowed by choices ({level: [names]}): within a level any chosen name matches,
+# across levels all must. Levels with nothing chosen don't filter.
+def hierarchy_rows(hierarchy, icb, choices):
+    rows = hierarchy.rows[icb]
+    for level, names in choices.items():
+        if names:
+            chosen = [hierarchy.members[level][icb, name] for name in names]
+            rows = np.intersect1d(rows, np.concatenate(chosen))
+    return rows
+
+
+# Practice display strings of hierarchy_rows, in dataset order
+def hierarchy_practices(hierarchy, icb, choices):
+    return hierarchy.display[hierarchy_rows(hierarchy, icb, choices)].tolist()
@@ -0,0 +1,48 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/practices.py
+DESCRIPTION:    Practice lookups by practice code and display string
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# 3rd party:
+import numpy as np
+
+# Row positions of every practice in a dataset, keyed by practice code and by practice_display,
+# with the practice codes, coordinates and weighted populations as compact arrays in the same row order
+def get_practice_index(data, weight_columns):
+    rows = range(len(data))
+    return {
+        "code": dict(zip(data["GP Practice code"], rows)),
+        "display": dict(zip(data["practice_display"], rows)),
+        "codes": data["GP Practice code"].to_numpy(dtype=object),
+        "lat_long": column_stack(data, ["Latitude", "Longitude"]),
+        "weights": column_stack(data, weight_columns),
+    }
+
+
+# Columns of a frame as one 2-D array, taken a column at a time: selecting several columns (data[columns]) would make
+# pandas consolidate the frame in place, copying the memory-mapped columns of a loaded dataset (see
+# allocation.data.frame_from_table)
+def column_stack(data, columns):
+    return np.column_stack([data[column].to_numpy() for column in columns])
+
+
+# Row positions (in dataset order) of a list of practice display strings or practice codes.
+# Practices that aren't in the dataset are left out.
+def practice_rows(practice_index, practices):
+    rows = set()
+    for practice in practices:
+        row = practice_index["display"].get(practice, practice_index["code"].get(practice))
+        if row is not None:
+            rows.add(row)
+    return sorted(rows)
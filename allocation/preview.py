@@ -0,0 +1,51 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/preview.py
+DESCRIPTION:    Filtering, sorting and paging of result tables for the data preview
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# 3rd party:
+import numpy as np
+
+
+# Row positions of df whose text in any text column (e.g. place and ICB names) contains text (ignoring case),
+# sorted on sort_by (None keeps the table order, equal values keep their order)
+def preview_rows(df, text="", sort_by=None, descending=False):
+    rows = np.arange(len(df))
+    if text:
+        found = np.zeros(len(df), dtype=bool)
+        for column in df.select_dtypes(exclude="number").columns:
+            found |= df[column].astype(str).str.contains(text, case=False, regex=False).to_numpy()
+        rows = rows[found]
+    if sort_by is not None:
+        values = df[sort_by].iloc[rows]
+        order = values.reset_index(drop=True).sort_values(ascending=not descending, kind="stable").index
+        rows = rows[order.to_numpy()]
+    return rows
+
+
+# Number of pages of page_size rows (at least one, for an empty table)
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+# The page shown for a page number (numbered from 1): the last page when a filter leaves fewer pages than the
+# number kept by the page widget
+def clamp_page(page, n_rows, page_size):
+    return min(max(page, 1), page_count(n_rows, page_size))
+
+
+# The rows of df on one page (clamped, see clamp_page) of the preview_rows positions
+def preview_page(df, rows, page, page_size):
+    start = (clamp_page(page, len(rows), page_size) - 1) * page_size
+    return df.iloc[rows[start : start + page_size]]
@@ -0,0 +1,92 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/results.py
+DESCRIPTION:    Per-place results of one session, updated only for the places that changed
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# 3rd party:
+import numpy as np
+
+# local
+from allocation.calcs import (
+    assemble_places,
+    cached_place_results,
+    icb_rows,
+    index_names,
+    place_results,
+    session_places,
+)
+from allocation.practices import practice_rows
+
+
+# Result rows of a session's places against one dataset, kept between reruns. update() only calculates places
+# that are new or whose practices or ICB changed, and drops places no longer in the session. Every row goes
+# stale when the dataset (Time Period) changes.
+class SessionResults:
+    def __init__(self):
+        self.content_hash = None
+        # place name -> (practices, icb name, has practices in the dataset, sums, indices)
+        self.places = {}
+        # places calculated by the last update
+        self.recomputed = 0
+
+    # large_df for a session dict, as compute_places(session, dataset, cache)
+    def update(self, session, dataset, cache=None):
+        if dataset.content_hash != self.content_hash:
+            self.content_hash = dataset.content_hash
+            self.places = {}
+
+        places = session_places(session)
+        changed = [
+            (place, gps, icb)
+            for place, gps, icb in places
+            if self.places.get(place, (None, None))[:2] != (tuple(gps), icb)
+        ]
+        if changed:
+            place_rows = [practice_rows(dataset.practice_index, gps) for _, gps, _ in changed]
+            icb_index_rows = dataset.icb_table[index_names].to_numpy()[
+                icb_rows(dataset.icb_table, changed)
+            ]
+            if cache is None:
+                sums, index = place_results(
+                    place_rows, dataset.practice_index["weights"], icb_index_rows
+                )
+            else:
+                sums, index = cached_place_results(
+                    cache,
+                    dataset.content_hash,
+                    dataset.practice_index,
+                    changed,
+                    place_rows,
+                    icb_index_rows,
+                )
+            for position, (place, gps, icb) in enumerate(changed):
+                self.places[place] = (
+                    tuple(gps),
+                    icb,
+                    len(place_rows[position]) > 0,
+                    sums[position],
+                    index[position],
+                )
+        self.places = {place: self.places[place] for place, _, _ in places}
+        self.recomputed = len(changed)
+
+        rows = list(self.places.values())
+        width = dataset.practice_index["weights"].shape[1]
+        return assemble_places(
+            places,
+            np.array([row[2] for row in rows], dtype=bool),
+            np.array([row[3] for row in rows], dtype=int).reshape(len(rows), width),
+            np.array([row[4] for row in rows]).reshape(len(rows), len(index_names)),
+            dataset.icb_table,
+        )
@@ -0,0 +1,198 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/sessions.py
+DESCRIPTION:    Reading, validating and resolving uploaded session files
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import gzip
+import json
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+
+# Version of the compact session file written by dump_session
+SESSION_VERSION = 2
+
+
+class SessionError(ValueError):
+    pass
+
+
+# "B85005: Shepley Health Centre" -> "B85005". Practice codes are returned unchanged.
+def practice_code(practice):
+    return practice.split(":", 1)[0].strip()
+
+
+# Compact session file: a version number and a list of places, each with its practices as practice codes, so the
+# file is smaller and still matches practices whose names change between years. Optionally gzip compressed.
+def dump_session(session, compress=False):
+    compact = {
+        "version": SESSION_VERSION,
+        "places": [
+            {
+                "name": place,
+                "icb": session[place]["icb"],
+                "gps": [practice_code(gp) for gp in session[place]["gps"]],
+            }
+            for place in session["places"]
+        ],
+    }
+    data = json.dumps(compact, separators=(",", ":")).encode("utf-8")
+    return gzip.compress(data, compresslevel=6, mtime=0) if compress else data
+
+
+# Compact (version 2) session file to a session dict
+def expand_session(compact):
+    if compact["version"] != SESSION_VERSION:
+        raise SessionError(f"session file version {compact['version']} isn't supported")
+    places = compact.get("places")
+    if not isinstance(places, list) or not all(isinstance(place, dict) and "name" in place for place in places):
+        raise SessionError('expected a "places" list of places with a "name"')
+    session = {place["name"]: {"gps": place.get("gps"), "icb": place.get("icb")} for place in places}
+    session["places"] = [place["name"] for place in places]
+    return session
+
+
+# Session dict from a session file (see docs/json_format_primer.md), checked for structure. Reads the compact
+# format written by dump_session (gzip compressed or not) and the original format, where places' practices are
+# display strings, including files with a "group_list" rather than "places" list from early versions of the tool.
+def read_session(data):
+    if isinstance(data, bytes) and data[:2] == b"\x1f\x8b":
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError) as e:
+            raise SessionError(f"not a gzip file: {e}") from None
+    try:
+        session = json.loads(data)
+    except ValueError as e:
+        raise SessionError(f"not a JSON file: {e}") from None
+    if not isinstance(session, dict):
+        raise SessionError("expected a JSON object of places")
+    if "version" in session:
+        session = expand_session(session)
+    return check_session(session)
+
+
+# A session dict checked for structure, with only its places and their practices and ICB
+def check_session(session):
+    places = session.get("places", session.get("group_list"))
+    if not isinstance(places, list) or not all(isinstance(place, str) for place in places):
+        raise SessionError('expected a "places" list of place names')
+    problems = []
+    for place in places:
+        value = session.get(place)
+        if not isinstance(value, dict):
+            problems.append(f"{place}: missing")
+        elif not isinstance(value.get("gps"), list) or not all(isinstance(gp, str) for gp in value["gps"]):
+            problems.append(f'{place}: "gps" is not a list of practices')
+        elif not isinstance(value.get("icb"), str):
+            problems.append(f'{place}: "icb" is not an ICB name')
+    if len(set(places)) != len(places):
+        problems.append("place names are repeated in the places list")
+    if problems:
+        more = f" (and {len(problems) - 10} more)" if len(problems) > 10 else ""
+        raise SessionError("; ".join(problems[:10]) + more)
+    return {"places": places, **{place: {"gps": session[place]["gps"], "icb": session[place]["icb"]} for place in places}}
+
+
+# A session dict without the named places
+def without_places(session, names):
+    names = set(names)
+    places = [place for place in session["places"] if place not in names]
+    return {"places": places, **{place: session[place] for place in places}}
+
+
+# A session resolved against a dataset. session has the practices found in the dataset as practice codes, and only
+# the places whose ICB is in the dataset (they can't be calculated).
+# unknown: (place, practice) not in the dataset; renamed: (place, practice, display string in the dataset)
+# matched on practice code; moved: (place, practice, ICB in the dataset) for practices in a different ICB to
+# their place; unknown_icbs: (place, ICB) for ICBs not in the dataset, whose places were left out.
+@dataclass(frozen=True)
+class SessionReport:
+    session: dict
+    practices: int
+    unknown: list
+    renamed: list
+    moved: list
+    unknown_icbs: list
+
+    @property
+    def ok(self):
+        return not (self.unknown or self.renamed or self.moved or self.unknown_icbs)
+
+    # Markdown summary, listing up to limit of each kind of problem
+    def summary(self, limit=10):
+        lines = [f"{len(self.session['places'])} places with {self.practices} GP practices loaded."]
+        for items, title, describe in [
+            (self.unknown_icbs, "places not loaded, ICB not in this time period", lambda place, icb: f"{place}: {icb}"),
+            (self.unknown, "GP practices not in this time period", lambda place, gp: f"{place}: {gp}"),
+            (self.renamed, "GP practices renamed", lambda place, gp, new: f"{place}: {gp} is now {new}"),
+            (self.moved, "GP practices in a different ICB", lambda place, gp, icb: f"{place}: {gp} is in {icb}"),
+        ]:
+            if items:
+                lines.append(f"**{len(items)} {title}**")
+                lines.extend(f"- {describe(*item)}" for item in items[:limit])
+                if len(items) > limit:
+                    lines.append(f"- and {len(items) - limit} more")
+        return "\n".join(lines)
+
+
+# Every practice of every place matched to a dataset row in one join: on the practice code, then the display
+# string, then the practice code in front of the ": " (a renamed practice). Matched practices are stored as
+# practice codes in the resolved session.
+def resolve_session(session, dataset):
+    places = session["places"]
+    lengths = [len(session[place]["gps"]) for place in places]
+    gps = pd.Series([gp for place in places for gp in session[place]["gps"]], dtype=object)
+    owners = np.repeat(np.arange(len(places)), lengths)
+    place_icbs = np.array([session[place]["icb"] for place in places], dtype=object)
+    known_icbs = np.array([icb in dataset.hierarchy.rows for icb in place_icbs], dtype=bool)
+
+    display = pd.Index(dataset.data["practice_display"])
+    codes = pd.Index(dataset.data["GP Practice code"])
+    rows = codes.get_indexer(gps)
+    missing = np.flatnonzero(rows < 0)
+    rows[missing] = display.get_indexer(gps.iloc[missing])
+    missing = np.flatnonzero(rows < 0)
+    by_code = codes.get_indexer(gps.iloc[missing].str.split(":", n=1).str[0].str.strip())
+    renamed = np.zeros(len(rows), dtype=bool)
+    renamed[missing[by_code >= 0]] = True
+    rows[missing] = by_code
+    # practices of places left out for their ICB aren't reported
+    renamed &= known_icbs[owners]
+    unknown = (rows < 0) & known_icbs[owners]
+
+    practice_icbs = dataset.data["ICB name"].to_numpy(dtype=object)[np.maximum(rows, 0)]
+    moved = ~unknown & known_icbs[owners] & (practice_icbs != place_icbs[owners])
+
+    practices = gps.to_numpy()
+    current = np.where(rows < 0, practices, codes.to_numpy()[np.maximum(rows, 0)])
+    resolved = {"places": [place for place, known in zip(places, known_icbs) if known]}
+    for place, start, end, known in zip(places, np.cumsum([0] + lengths[:-1]), np.cumsum(lengths), known_icbs):
+        if known:
+            resolved[place] = {"gps": current[start:end].tolist(), "icb": session[place]["icb"]}
+
+    return SessionReport(
+        session=resolved,
+        practices=int(sum(length for length, known in zip(lengths, known_icbs) if known)),
+        unknown=[(places[owners[i]], practices[i]) for i in np.flatnonzero(unknown)],
+        renamed=[
+            (places[owners[i]], practices[i], display[rows[i]]) for i in np.flatnonzero(renamed)
+        ],
+        moved=[(places[owners[i]], practices[i], practice_icbs[i]) for i in np.flatnonzero(moved)],
+        unknown_icbs=[(place, icb) for place, icb, known in zip(places, place_icbs, known_icbs) if not known],
+    )
@@ -0,0 +1,165 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/spatial.py
+DESCRIPTION:    Grid index over practice coordinates for radius, nearest and polygon selection
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+# Practices bucketed into a regular latitude / longitude grid. Cells are numbered row by row (latitude, then
+# longitude), order holds the practice rows sorted by cell and cell_start[c]:cell_start[c + 1] the slice of order
+# in cell c, so a run of cells along one grid row is one contiguous slice. Practices without coordinates aren't
+# indexed.
+@dataclass(frozen=True)
+class SpatialIndex:
+    lat_long: np.ndarray
+    cell_size: float
+    origin: np.ndarray
+    shape: tuple
+    order: np.ndarray
+    cell_start: np.ndarray
+
+
+def build_spatial_index(lat_long, cell_size=0.1):
+    lat_long = np.asarray(lat_long, dtype=float)
+    rows = np.flatnonzero(np.isfinite(lat_long).all(axis=1))
+    if len(rows):
+        origin = lat_long[rows].min(axis=0)
+        cells = ((lat_long[rows] - origin) // cell_size).astype(np.intp)
+        shape = tuple(cells.max(axis=0) + 1)
+    else:
+        origin = np.zeros(2)
+        cells = np.zeros((0, 2), dtype=np.intp)
+        shape = (1, 1)
+    cell = cells[:, 0] * shape[1] + cells[:, 1]
+    sort = np.argsort(cell, kind="stable")
+    return SpatialIndex(
+        lat_long=lat_long,
+        cell_size=cell_size,
+        origin=origin,
+        shape=shape,
+        order=rows[sort],
+        cell_start=np.searchsorted(cell[sort], np.arange(shape[0] * shape[1] + 1)),
+    )
+
+
+# Great circle distance in km from (latitude, longitude) to each of the lat_long rows
+def distance_km(lat_long, latitude, longitude):
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(lat_long[:, 0]), np.radians(lat_long[:, 1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+# Practice rows in the grid cells overlapping a latitude / longitude box
+def box_rows(index, south, west, north, east):
+    first = np.floor((np.array([south, west]) - index.origin) / index.cell_size).astype(np.intp)
+    last = np.floor((np.array([north, east]) - index.origin) / index.cell_size).astype(np.intp)
+    first = np.maximum(first, 0)
+    last = np.minimum(last, np.array(index.shape) - 1)
+    if (first > last).any():
+        return np.zeros(0, dtype=np.intp)
+    row_starts = np.arange(first[0], last[0] + 1) * index.shape[1]
+    starts = index.cell_start[row_starts + first[1]]
+    ends = index.cell_start[row_starts + last[1] + 1]
+    return np.concatenate([index.order[start:end] for start, end in zip(starts, ends)])
+
+
+# Box around a circle, widened in longitude for the latitude furthest from the equator
+def circle_box(latitude, longitude, radius_km):
+    lat_delta = np.degrees(radius_km / EARTH_RADIUS_KM)
+    furthest = min(abs(latitude) + lat_delta, 89.9)
+    lon_delta = min(np.degrees(radius_km / (EARTH_RADIUS_KM * np.cos(np.radians(furthest)))), 180)
+    return latitude - lat_delta, longitude - lon_delta, latitude + lat_delta, longitude + lon_delta
+
+
+# Practice rows (in row order) within radius_km of a point
+def practices_within(index, latitude, longitude, radius_km):
+    rows = box_rows(index, *circle_box(latitude, longitude, radius_km))
+    rows = rows[distance_km(index.lat_long[rows], latitude, longitude) <= radius_km]
+    return np.sort(rows)
+
+
+# The k practice rows nearest a point, nearest first, with their distances in km. allowed (a boolean per practice
+# row) limits the search, e.g. to one ICB. The search radius doubles until the circle holds at least k practices
+# (or its box covers the whole grid).
+def nearest_practices(index, latitude, longitude, k, allowed=None):
+    radius_km = index.cell_size * 111
+    while True:
+        south, west, north, east = circle_box(latitude, longitude, radius_km)
+        rows = box_rows(index, south, west, north, east)
+        whole_grid = len(rows) == len(index.order)
+        if allowed is not None:
+            rows = rows[allowed[rows]]
+        distances = distance_km(index.lat_long[rows], latitude, longitude)
+        if whole_grid or (distances <= radius_km).sum() >= k:
+            break
+        radius_km *= 2
+    nearest = np.argsort(distances, kind="stable")[:k]
+    return rows[nearest], distances[nearest]
+
+
+# Polygons of a GeoJSON FeatureCollection, Feature, Polygon or MultiPolygon, each a list of rings of
+# [longitude, latitude] positions (the first ring the outline, any others holes)
+def geojson_polygons(geojson):
+    kind = geojson.get("type") if isinstance(geojson, dict) else None
+    if kind == "FeatureCollection":
+        return [polygon for feature in geojson.get("features", []) for polygon in geojson_polygons(feature)]
+    if kind == "Feature":
+        return geojson_polygons(geojson.get("geometry"))
+    if kind == "GeometryCollection":
+        return [polygon for geometry in geojson.get("geometries", []) for polygon in geojson_polygons(geometry)]
+    if kind == "Polygon":
+        return [geojson["coordinates"]]
+    if kind == "MultiPolygon":
+        return list(geojson["coordinates"])
+    raise ValueError(f"GeoJSON {kind or 'object'} has no Polygon or MultiPolygon geometry")
+
+
+# Even-odd ray casting of points (rows of latitude, longitude) against every edge of every ring at once,
+# in chunks of edges to bound the (edge x point) arrays
+def points_in_rings(points, rings, chunk=1024):
+    edges = []
+    for ring in rings:
+        ring = np.asarray(ring, dtype=float)[:, :2]
+        edges.append(np.column_stack([ring, np.roll(ring, -1, axis=0)]))
+    edges = np.concatenate(edges)
+    latitude, longitude = points[:, 0], points[:, 1]
+    crossings = np.zeros(len(points), dtype=np.intp)
+    for start in range(0, len(edges), chunk):
+        x1, y1, x2, y2 = edges[start : start + chunk, :, None].transpose(1, 0, 2)
+        straddles = (y1 > latitude) != (y2 > latitude)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            crossing_x = x1 + (latitude - y1) * (x2 - x1) / (y2 - y1)
+        crossings += (straddles & (longitude < crossing_x)).sum(axis=0)
+    return crossings % 2 == 1
+
+
+# Practice rows (in row order) inside any polygon of a GeoJSON object
+def practices_in_polygon(index, geojson):
+    found = []
+    for rings in geojson_polygons(geojson):
+        outline = np.asarray(rings[0], dtype=float)
+        if outline.ndim != 2 or len(outline) < 3:
+            raise ValueError("GeoJSON polygon needs at least three positions")
+        (west, south), (east, north) = outline[:, :2].min(axis=0), outline[:, :2].max(axis=0)
+        rows = box_rows(index, south, west, north, east)
+        found.append(rows[points_in_rings(index.lat_long[rows], rings)])
+    return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.intp)
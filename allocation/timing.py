@@ -0,0 +1,67 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/timing.py
+DESCRIPTION:    Per-stage timings, logged as one JSON line per stage
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("allocation.timing")
+
+
+# Log one stage as a JSON line: {"stage": ..., "duration_ms": ..., plus fields such as dataset, places,
+# practices and cache ("hit" / "miss")}. Returns the record.
+def log_stage(stage, duration, **fields):
+    record = {"stage": stage, "duration_ms": round(duration * 1000, 3), **fields}
+    logger.info(json.dumps(record, default=str))
+    return record
+
+
+# Time a block. Fields known only inside the block (e.g. cache hit or miss) can be set on the yielded dict.
+@contextmanager
+def stage(name, **fields):
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        log_stage(name, time.perf_counter() - start, **fields)
+
+
+# Times consecutive stages of one run (e.g. a dashboard rerun) and keeps their records. start() ends the
+# stage before it, so the stages can be marked without re-indenting the code they cover. context fields
+# (e.g. dataset) are added to every record.
+class StageTimer:
+    def __init__(self, **context):
+        self.context = context
+        self.records = []
+        self.current = None
+
+    def start(self, stage, **fields):
+        self.stop()
+        self.current = (stage, fields, time.perf_counter())
+
+    def stop(self, **fields):
+        if self.current is None:
+            return
+        stage, start_fields, start = self.current
+        self.current = None
+        self.records.append(
+            log_stage(stage, time.perf_counter() - start, **self.context, **start_fields, **fields)
+        )
+
+    def total(self):
+        return sum(record["duration_ms"] for record in self.records)
@@ -0,0 +1,104 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/whatif.py
+DESCRIPTION:    What-if changes to one place, adding and removing single practices
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# 3rd party:
+import numpy as np
+
+# local
+from allocation.calcs import aggregations, index_names, index_numerator
+from allocation.practices import practice_rows
+
+gp_pop_column = list(aggregations).index("GP pop")
+numerator_columns = [list(aggregations).index(column) for column in index_numerator]
+
+
+# A place being edited practice by practice. sums holds the running (unrounded) weighted population sums of the
+# member rows, so adding or removing a practice is one row added to or taken from sums, and the indices are
+# recalculated from sums and the ICB's index row: the cost doesn't depend on the size of the place. The sums
+# and indices match place_results for the same practices, up to floating point rounding.
+class WhatIf:
+    def __init__(self, weights, icb_index_row, rows=()):
+        self.weights = weights
+        self.icb_index_row = icb_index_row
+        self.members = set(rows)
+        self.sums = weights[sorted(self.members)].sum(axis=0)
+        # practice rows toggled since the place was loaded, as row -> True (added) or False (removed)
+        self.changes = {}
+        # indices of the place as loaded, to show the change from
+        self.saved_index = self.place_index()
+
+    # What-if of a saved place (its practices and ICB) against a loaded dataset
+    @classmethod
+    def from_place(cls, dataset, gps, icb):
+        icb_index_row = dataset.icb_table.loc[icb, index_names].to_numpy(dtype=float)
+        return cls(
+            dataset.practice_index["weights"],
+            icb_index_row,
+            practice_rows(dataset.practice_index, gps),
+        )
+
+    def add(self, row):
+        if row not in self.members:
+            self.members.add(row)
+            self.sums = self.sums + self.weights[row]
+            self.record(row, True)
+
+    def remove(self, row):
+        if row in self.members:
+            self.members.remove(row)
+            self.sums = self.sums - self.weights[row]
+            self.record(row, False)
+
+    def toggle(self, row):
+        if row in self.members:
+            self.remove(row)
+        else:
+            self.add(row)
+
+    # Toggling a practice back cancels the earlier change
+    def record(self, row, added):
+        if self.changes.pop(row, added) == added:
+            self.changes[row] = added
+
+    # Weighted population sums in aggregations order, rounded as place_results
+    def place_sums(self):
+        if not self.members:
+            return np.zeros(len(self.sums), dtype=int)
+        return self.sums.round(0).astype(int)
+
+    # Indices in index_names order, relative to the ICB (NaN when the place has no practices)
+    def place_index(self):
+        place_sums = self.place_sums()
+        if not self.members:
+            return np.full(len(index_names), np.nan)
+        return place_sums[numerator_columns] / place_sums[gp_pop_column] / self.icb_index_row
+
+    # The place's practice list (gps) with the changes made here: removed practices are taken out and added ones
+    # appended as codes. Practices that aren't in this dataset (e.g. not in this Time Period) are kept as they were.
+    def apply(self, practice_index, gps):
+        removed = {row for row, added in self.changes.items() if not added}
+        kept = [
+            gp for gp in gps if practice_index["display"].get(gp, practice_index["code"].get(gp)) not in removed
+        ]
+        present = set(practice_rows(practice_index, kept))
+        return kept + [
+            practice_index["codes"][row] for row, added in sorted(self.changes.items()) if added and row not in present
+        ]
+
+    # index name -> (index, change from the place as loaded)
+    def metrics(self):
+        place_index = self.place_index()
+        return dict(zip(index_names, zip(place_index, place_index - self.saved_index)))
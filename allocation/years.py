@@ -0,0 +1,163 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           allocation/years.py
+DESCRIPTION:    Place and ICB indices for every dataset (time period) at once
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import itertools
+from dataclasses import dataclass
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+# local
+from allocation.calcs import aggregations, index_names, index_numerator, session_places
+
+
+# Time Period label used by the dashboard, e.g. 2023_2024.csv -> 2023/2024
+def dataset_year(dataset_name):
+    return dataset_name.replace(".csv", "").replace("_", "/")
+
+
+# Every dataset aligned on practice code. weights is a (year x practice x measure) array in aggregations order,
+# zero where a practice isn't in that year's data. icb_sums / icb_index are (year x ICB x measure / index), NaN for
+# an ICB missing from a year.
+@dataclass(frozen=True)
+class YearStack:
+    years: list
+    codes: list
+    code_position: dict
+    display_code: dict
+    present: np.ndarray
+    weights: np.ndarray
+    icbs: list
+    icb_position: dict
+    icb_sums: np.ndarray
+    icb_index: np.ndarray
+
+
+def stack_datasets(datasets):
+    # practice codes sorted, as the datasets are, so each year sums practices in its own row order
+    codes = sorted(set().union(*(dataset.practice_index["code"] for dataset in datasets)))
+    code_position = {code: position for position, code in enumerate(codes)}
+    icbs = sorted(set().union(*(dataset.icb_table.index for dataset in datasets)))
+    icb_position = {icb: position for position, icb in enumerate(icbs)}
+
+    shape = (len(datasets), len(codes), len(aggregations))
+    present = np.zeros(shape[:2], dtype=bool)
+    weights = np.zeros(shape)
+    icb_sums = np.full((len(datasets), len(icbs), len(aggregations)), np.nan)
+    icb_index = np.full((len(datasets), len(icbs), len(index_names)), np.nan)
+    display_code = {}
+    for year, dataset in enumerate(datasets):
+        practice_index = dataset.practice_index
+        columns = [code_position[code] for code in practice_index["code"]]
+        present[year, columns] = True
+        weights[year, columns] = practice_index["weights"]
+        rows = [icb_position[icb] for icb in dataset.icb_table.index]
+        icb_sums[year, rows] = dataset.icb_table[list(aggregations)].to_numpy()
+        icb_index[year, rows] = dataset.icb_table[index_names].to_numpy()
+        display_code.update(zip(dataset.data["practice_display"], dataset.data["GP Practice code"]))
+
+    return YearStack(
+        years=[dataset_year(dataset.name) for dataset in datasets],
+        codes=codes,
+        code_position=code_position,
+        display_code=display_code,
+        present=present,
+        weights=weights,
+        icbs=icbs,
+        icb_position=icb_position,
+        icb_sums=icb_sums,
+        icb_index=icb_index,
+    )
+
+
+# Practice columns of a list of practice display strings or codes, matched on practice code in any year
+def practice_columns(stack, practices):
+    columns = set()
+    for practice in practices:
+        column = stack.code_position.get(stack.display_code.get(practice, practice))
+        if column is not None:
+            columns.add(column)
+    return sorted(columns)
+
+
+# Place and ICB sums and indices for every year, with the change in each index from the previous year.
+# One row per Place / ICB and year, in the same Place / ICB order as large_df.
+def compare_places(session, stack):
+    places = session_places(session)
+    place_columns = [practice_columns(stack, gps) for _, gps, _ in places]
+    lengths = np.array([len(columns) for columns in place_columns], dtype=np.intp)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = np.fromiter(
+        itertools.chain.from_iterable(place_columns), dtype=np.intp, count=indptr[-1]
+    )
+    has_rows = lengths > 0
+
+    # (year x place x measure) sums, all years in one sparse product
+    sums = np.zeros((len(stack.years), len(places), len(aggregations)))
+    if has_rows.any():
+        sums[:, has_rows] = np.add.reduceat(
+            stack.weights[:, indices], indptr[:-1][has_rows], axis=1
+        )
+    sums = sums.round(0)
+
+    place_icb_rows = np.array([stack.icb_position[icb] for _, _, icb in places], dtype=np.intp)
+    gp_pop = list(aggregations).index("GP pop")
+    numerator = [list(aggregations).index(column) for column in index_numerator]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        place_index = (
+            sums[:, :, numerator]
+            / sums[:, :, [gp_pop]]
+            / stack.icb_index[:, place_icb_rows]
+        )
+
+    # ICB row first, then its places in session order (as in batch_indices)
+    icb_order = np.array(list(dict.fromkeys(place_icb_rows)), dtype=np.intp)
+    group_of = {icb: group for group, icb in enumerate(icb_order)}
+    kept = np.flatnonzero(has_rows)
+    group = np.concatenate(
+        [np.arange(len(icb_order)), [group_of[icb] for icb in place_icb_rows[kept]]]
+    )
+    order = np.lexsort((np.arange(len(group)), group))
+    names = np.array(
+        [stack.icbs[icb] for icb in icb_order] + [places[place][0] for place in kept],
+        dtype=object,
+    )[order]
+    entity_sums = np.concatenate([stack.icb_sums[:, icb_order], sums[:, kept]], axis=1)[:, order]
+    entity_index = np.concatenate(
+        [stack.icb_index[:, icb_order], place_index[:, kept]], axis=1
+    )[:, order]
+    change = np.full_like(entity_index, np.nan)
+    change[1:] = entity_index[1:] - entity_index[:-1]
+
+    # one row per (Place / ICB, year)
+    n_years = len(stack.years)
+
+    def by_row(values):
+        return values.swapaxes(0, 1).reshape(len(names) * n_years, -1).T
+
+    comparison = pd.DataFrame(
+        {
+            "Place / ICB": np.repeat(names, n_years),
+            "Year": np.tile(np.array(stack.years, dtype=object), len(names)),
+            **dict(zip(aggregations, by_row(entity_sums))),
+            **dict(zip(index_names, by_row(entity_index))),
+            **dict(zip([f"{name} change" for name in index_names], by_row(change))),
+        }
+    )
+    comparison[list(aggregations)] = comparison[list(aggregations)].astype("Int64")
+    return comparison.round(decimals=3)
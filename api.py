@@ -0,0 +1,193 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           api.py
+DESCRIPTION:    Local HTTP service returning place calculations for session JSON
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import json
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 3rd party:
+import pandas as pd
+
+# local
+import allocation
+
+# Longest wait for one batch of calculations before a request gives up, in seconds
+REQUEST_TIMEOUT = 60
+
+
+# Session dict and requested years from a POST body: a session file in either format (see
+# docs/json_format_primer.md), a list of {"place", "icb", "practices"} objects, or an object with such a list
+# as "places" and optionally "years"
+def parse_request(body):
+    try:
+        request = json.loads(body)
+    except ValueError as e:
+        raise allocation.SessionError(f"not JSON: {e}") from None
+    if isinstance(request, list):
+        request = {"places": request}
+    if not isinstance(request, dict):
+        raise allocation.SessionError("expected a session object or a list of places")
+    years = request.pop("years", [])
+    years = [years] if isinstance(years, str) else years
+    if not isinstance(years, list) or not all(isinstance(year, str) for year in years):
+        raise allocation.SessionError('"years" is a year such as "2024/2025" or a list of years')
+    places = request.get("places")
+    if "version" in request:
+        session = allocation.expand_session(request)
+    elif isinstance(places, list) and places and all(isinstance(place, dict) for place in places):
+        compact = [
+            {
+                "name": place.get("place", place.get("name")),
+                "icb": place.get("icb"),
+                "gps": place.get("practices", place.get("gps")),
+            }
+            for place in places
+        ]
+        session = allocation.expand_session({"version": allocation.SESSION_VERSION, "places": compact})
+    else:
+        session = request
+    return allocation.check_session(session), years
+
+
+class PlaceService:
+    def __init__(self, dataset_paths, max_wait=0.005):
+        datasets = [allocation.load_dataset(path) for path in dataset_paths]
+        self.datasets = {allocation.dataset_year(dataset.name): dataset for dataset in datasets}
+        self.batcher = allocation.PlaceBatcher(self.datasets, max_wait=max_wait)
+
+    # large_df rows for every requested year (default every dataset), with the year in front as in batch_places
+    def places(self, session, years):
+        years = [allocation.dataset_year(year) for year in years] or list(self.datasets)
+        unknown = [year for year in years if year not in self.datasets]
+        if unknown:
+            raise allocation.SessionError(f"no dataset for {', '.join(unknown)}")
+        futures = [(year, self.batcher.submit(session, year)) for year in years]
+        frames = []
+        for year, future in futures:
+            large_df = future.result(timeout=REQUEST_TIMEOUT)
+            large_df.insert(loc=0, column="Year", value=year)
+            frames.append(large_df)
+        return pd.concat(frames, ignore_index=True)
+
+
+class PlaceHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send(self, status, body, content_type="application/json"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        self.send(status, json.dumps({"error": message}))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            batcher = self.service.batcher
+            self.send(
+                200,
+                json.dumps(
+                    {
+                        "status": "ok",
+                        "years": list(self.service.datasets),
+                        "batches": batcher.batches,
+                        "batched requests": batcher.batched,
+                    }
+                ),
+            )
+        elif path == "/years":
+            self.send(200, json.dumps(list(self.service.datasets)))
+        else:
+            self.send_error_json(404, f"no such path {path}, use POST /places")
+
+    # POST /places?year=2023/2024&format=csv with the session JSON as the body
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/places":
+            self.send_error_json(404, f"no such path {url.path}, use POST /places")
+            return
+        query = parse_qs(url.query)
+        output = query.get("format", ["json"])[0]
+        if output not in ("json", "csv"):
+            self.send_error_json(400, 'format is "json" or "csv"')
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            session, years = parse_request(body)
+            large_df = self.service.places(session, years + query.get("year", []))
+        except allocation.SessionError as e:
+            self.send_error_json(400, str(e))
+            return
+        except Exception as e:
+            self.send_error_json(500, f"{type(e).__name__}: {e}")
+            raise
+        if output == "csv":
+            self.send(200, large_df.to_csv(index=False), "text/csv")
+        else:
+            self.send(200, large_df.to_json(orient="records"))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("DESCRIPTION:")[1].split("\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("-p", "--port", type=int, default=8502, help="port to listen on")
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        action="append",
+        help="dataset CSV to serve, can be repeated (default: every data/*.csv)",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=5,
+        help="how long to collect concurrent requests into one batch",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset_paths = args.dataset or allocation.dataset_paths()
+    PlaceHandler.service = PlaceService(dataset_paths, args.max_wait_ms / 1000)
+    server = ThreadingHTTPServer((args.host, args.port), PlaceHandler)
+    server.daemon_threads = True
+    server.verbose = args.verbose
+    print(
+        f"serving {', '.join(PlaceHandler.service.datasets)} on http://{args.host}:{args.port}/places "
+        f"(datasets loaded in {time.perf_counter() - start:.2f}s)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
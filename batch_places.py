@@ -0,0 +1,153 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           batch_places.py
+DESCRIPTION:    Evaluate many session JSON files against one or more datasets
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# 3rd party:
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# local
+import allocation
+
+# datasets loaded in each worker (inherited from the parent where processes are forked)
+datasets = {}
+
+# places shared between session files (e.g. the default place) are calculated once per worker
+place_cache = allocation.PlaceCache()
+
+
+# Session JSON files from a list of files, directories and glob patterns
+def find_sessions(inputs):
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, "*.json"))))
+        else:
+            files.extend(sorted(glob.glob(item)))
+    return list(dict.fromkeys(files))
+
+
+def load_datasets(paths):
+    for path in paths:
+        if path not in datasets:
+            datasets[path] = allocation.load_dataset(path)
+
+
+# large_df rows for one session file against every dataset, with the source file and year in front
+def evaluate_session(file_name):
+    with open(file_name) as fh:
+        session = allocation.read_session(fh.read())
+    frames = []
+    for path, dataset in datasets.items():
+        large_df = allocation.compute_places(session, dataset, place_cache)
+        large_df.insert(loc=0, column="Year", value=allocation.dataset_year(dataset.name))
+        large_df.insert(loc=0, column="Source file", value=file_name)
+        frames.append(large_df)
+    return pd.concat(frames, ignore_index=True), len(session["places"]) * len(frames)
+
+
+# Catch per-file errors in the worker so one bad file doesn't stop the run
+def evaluate_session_safe(file_name):
+    try:
+        return evaluate_session(file_name) + (None,)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return None, 0, f"{type(e).__name__}: {e}"
+
+
+# Appends result frames to a CSV or Parquet file as they arrive
+class ResultWriter:
+    def __init__(self, output):
+        self.output = output
+        self.parquet = output.endswith(".parquet")
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.parquet:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.output, table.schema)
+            self.writer.write_table(table)
+        else:
+            df.to_csv(self.output, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("DESCRIPTION:")[1].split("\n")[0].strip())
+    parser.add_argument("inputs", nargs="+", help="session JSON files, directories or glob patterns")
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        action="append",
+        help="dataset CSV to evaluate against, can be repeated (default: every data/*.csv)",
+    )
+    parser.add_argument("-o", "--output", default="places.csv", help="output .csv or .parquet file")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="worker processes")
+    args = parser.parse_args(argv)
+
+    dataset_paths = args.dataset or allocation.dataset_paths()
+    files = find_sessions(args.inputs)
+    if not files:
+        parser.error("no session files found")
+
+    start = time.perf_counter()
+    load_datasets(dataset_paths)
+    load_time = time.perf_counter() - start
+
+    writer = ResultWriter(args.output)
+    places = failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=load_datasets, initargs=(dataset_paths,)
+    ) as executor:
+        chunksize = max(1, len(files) // (4 * args.workers))
+        for file_name, (df, n_places, error) in zip(
+            files, executor.map(evaluate_session_safe, files, chunksize=chunksize)
+        ):
+            if error is not None:
+                failed += 1
+                print(f"{file_name}: {error}", file=sys.stderr)
+                continue
+            writer.write(df)
+            places += n_places
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{len(files) - failed} session files, {len(dataset_paths)} datasets, {places} places "
+        f"in {elapsed:.2f}s ({places / elapsed:,.0f} places/s, datasets loaded in {load_time:.2f}s)"
+    )
+    if failed:
+        print(f"{failed} session files failed", file=sys.stderr)
+    print(f"{writer.rows} rows written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
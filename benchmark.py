@@ -0,0 +1,304 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           benchmark.py
+DESCRIPTION:    Time the load -> aggregate -> index -> export path on real and synthetic data
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+# local
+import allocation
+
+# (n practices, n places, n years) for each synthetic scenario
+scenarios = {
+    "small": (6_500, 100, 2),
+    "large": (100_000, 1_000, 5),
+}
+
+
+# Synthetic datasets in the published CSV layout: n_icbs ICBs of LA districts of practices,
+# with weighted populations scattered around the GP population. Returns the CSV paths.
+def write_synthetic(directory, n_practices, n_years, n_icbs=42, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f"S{number:06d}" for number in range(n_practices)]
+    icb = rng.integers(n_icbs, size=n_practices)
+    lad = icb * 10 + rng.integers(10, size=n_practices)
+    base = {
+        "Practice_Code": codes,
+        "GP_Practice_Name": [f"Synthetic Practice {number}" for number in range(n_practices)],
+        "Practice_Postcode": "ZZ1 1ZZ",
+        "Latitude": rng.uniform(50, 55.5, n_practices),
+        "Longitude": rng.uniform(-5, 1.5, n_practices),
+        "CCG21": [f"C{number:02d}" for number in icb],
+        "Former CCG": [f"NHS Synthetic CCG {number}" for number in icb],
+        "PCN_Code": np.nan,
+        "PCN_Name": np.nan,
+        "LOC22": np.nan,
+        "LOC22name": np.nan,
+        "ICS22": [f"Q{number:02d}" for number in icb],
+        "ICS22name": [f"NHS Synthetic ICB {number}" for number in icb],
+        "R22": "Y00",
+        "Region22": "Synthetic Region",
+        "LAD21": [f"E{number:08d}" for number in lad],
+        "LTLA21": [f"Synthetic District {number}" for number in lad],
+        "LA21": [f"E{number:08d}" for number in lad],
+        "UTLA21": [f"Synthetic District {number}" for number in lad],
+        "Patients": np.nan,
+    }
+    measures = [column for column in allocation.rename_columns if column.endswith("WP")]
+    paths = []
+    for year in range(n_years):
+        gp_pop = rng.gamma(2, 4_000, n_practices) + 500
+        df = pd.DataFrame(base)
+        df["pop 2022/23"] = gp_pop
+        for column in measures:
+            df[column] = gp_pop * rng.lognormal(0, 0.2, n_practices)
+        path = os.path.join(directory, f"{2030 + year}_{2031 + year}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+# A session dict of n_places places, each a random subset of one ICB's practices
+def synthetic_session(data, n_places, seed=0):
+    rnd = random.Random(seed)
+    by_icb = data.groupby("ICB name", observed=True)["practice_display"].apply(list).to_dict()
+    icbs = sorted(by_icb)
+    session = {"places": []}
+    for number in range(n_places):
+        icb = rnd.choice(icbs)
+        practices = by_icb[icb]
+        session[f"Place {number}"] = {
+            "gps": rnd.sample(practices, rnd.randint(1, min(len(practices), 300))),
+            "icb": icb,
+        }
+        session["places"].append(f"Place {number}")
+    return session
+
+
+def time_stage(results, stage, func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+    results[stage] = {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "repeat": repeat,
+    }
+    print(f"  {stage:<24} {results[stage]['median'] * 1000:10.2f} ms")
+    return value
+
+
+# The dashboard's per-place path: aggregate, get_index and the large_df concat
+def place_loop(dataset, session):
+    dict_obj = {}
+    for place in session["places"]:
+        place_state = session[place]["gps"]
+        icb_state = session[place]["icb"]
+        rows = allocation.practice_rows(dataset.practice_index, place_state)
+        _, place_groupby = allocation.aggregate(
+            dataset.data, rows, place, "Place Name", allocation.aggregations
+        )
+        icb_groupby = dataset.icb_table.loc[[icb_state]]
+        place_indices, icb_indices = allocation.get_index(
+            place_groupby, icb_groupby, allocation.index_names, allocation.index_numerator
+        )
+        dict_obj.setdefault(icb_state, [icb_indices]).append(place_indices)
+    return dict_obj
+
+
+def run_scenario(paths, n_places, repeat):
+    results = {}
+    path = paths[-1]
+    if os.path.exists(allocation.columnar_path(path)):
+        os.remove(allocation.columnar_path(path))
+    time_stage(results, "read_csv_data", lambda: allocation.read_csv_data(path), repeat)
+    allocation.build_columnar(path)
+    time_stage(results, "read_columnar_data", lambda: allocation.read_columnar_data(path), repeat)
+    dataset = time_stage(results, "load_dataset", lambda: allocation.load_dataset(path), repeat)
+    time_stage(
+        results,
+        "build_geographies",
+        lambda: allocation.build_geographies(dataset.data, dataset.icb_table),
+        repeat,
+    )
+
+    session = synthetic_session(dataset.data, n_places)
+    places = session["places"]
+    rows = [allocation.practice_rows(dataset.practice_index, session[place]["gps"]) for place in places]
+    groupbys = time_stage(
+        results,
+        "aggregate",
+        lambda: [
+            allocation.aggregate(dataset.data, place_rows, place, "Place Name", allocation.aggregations)[1]
+            for place, place_rows in zip(places, rows)
+        ],
+        repeat,
+    )
+    time_stage(
+        results,
+        "get_index",
+        lambda: [
+            allocation.get_index(
+                groupby.copy(),
+                dataset.icb_table.loc[[session[place]["icb"]]],
+                allocation.index_names,
+                allocation.index_numerator,
+            )
+            for place, groupby in zip(places, groupbys)
+        ],
+        repeat,
+    )
+    dict_obj = place_loop(dataset, session)
+    time_stage(
+        results,
+        "large_df_concat",
+        lambda: pd.concat(
+            [df for dfs in dict_obj.values() for df in dfs], ignore_index=True
+        ).round(decimals=3),
+        repeat,
+    )
+    time_stage(results, "place_loop", lambda: place_loop(dataset, session), repeat)
+    large_df = time_stage(
+        results, "compute_places", lambda: allocation.compute_places(session, dataset), repeat
+    )
+    cache = allocation.PlaceCache()
+    allocation.compute_places(session, dataset, cache)
+    time_stage(
+        results,
+        "compute_places_cached",
+        lambda: allocation.compute_places(session, dataset, cache),
+        repeat,
+    )
+
+    # 100 queries per timing, around random practices
+    rnd = random.Random(0)
+    centres = [dataset.practice_index["lat_long"][rnd.randrange(len(dataset.data))] for _ in range(100)]
+    time_stage(
+        results,
+        "spatial_radius_x100",
+        lambda: [allocation.practices_within(dataset.spatial_index, lat, long, 5) for lat, long in centres],
+        repeat,
+    )
+    time_stage(
+        results,
+        "spatial_nearest_x100",
+        lambda: [allocation.nearest_practices(dataset.spatial_index, lat, long, 10) for lat, long in centres],
+        repeat,
+    )
+
+    datasets = [dataset if other == path else allocation.load_dataset(other) for other in paths]
+    stack = time_stage(results, "stack_datasets", lambda: allocation.stack_datasets(datasets), repeat)
+    time_stage(results, "compare_places", lambda: allocation.compare_places(session, stack), repeat)
+
+    time_stage(results, "convert_df", lambda: allocation.csv_download(large_df), repeat)
+    session_dump = json.dumps(session, indent=4)
+    icbs = set(dataset.icb_table.index)
+    for stage, export_format in [
+        ("zip_build", "ZIP (CSV)"),
+        ("xlsx_build", "Excel (one sheet per ICB)"),
+        ("parquet_build", "Parquet"),
+    ]:
+        time_stage(
+            results,
+            stage,
+            lambda: allocation.build_export(export_format, large_df, icbs, dataset.name, session_dump),
+            repeat,
+        )
+    return results
+
+
+# Stages whose median got slower than the baseline by more than threshold (a fraction)
+def regressions(results, baseline, threshold):
+    flagged = []
+    for scenario, stages in results.items():
+        for stage, timing in stages.items():
+            before = baseline.get("results", {}).get(scenario, {}).get(stage)
+            if before and timing["median"] > before["median"] * (1 + threshold):
+                flagged.append((scenario, stage, before["median"], timing["median"]))
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the load -> aggregate -> index -> export path")
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=["real"] + list(scenarios),
+        help="scenarios to run, can be repeated (default: real and small)",
+    )
+    parser.add_argument("-p", "--places", type=int, default=100, help="places in the real-data session")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timings per stage (median reported)")
+    parser.add_argument("-o", "--output", default="bench_output.json", help="JSON results file")
+    parser.add_argument("-c", "--compare", help="earlier results JSON to flag regressions against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2, help="slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario in args.scenario or ["real", "small"]:
+            print(scenario)
+            if scenario == "real":
+                # copies, so the columnar files in data/ are left alone
+                paths = []
+                for path in allocation.dataset_paths():
+                    paths.append(os.path.join(directory, os.path.basename(path)))
+                    with open(path, "rb") as src, open(paths[-1], "wb") as dest:
+                        dest.write(src.read())
+                results[scenario] = run_scenario(paths, args.places, args.repeat)
+            else:
+                n_practices, n_places, n_years = scenarios[scenario]
+                scenario_directory = os.path.join(directory, scenario)
+                os.mkdir(scenario_directory)
+                paths = write_synthetic(scenario_directory, n_practices, n_years)
+                results[scenario] = run_scenario(paths, n_places, args.repeat)
+
+    output = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+    }
+    with open(args.output, "w") as fh:
+        json.dump(output, fh, indent=4)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            flagged = regressions(results, json.load(fh), args.threshold)
+        for scenario, stage, before, after in flagged:
+            print(f"REGRESSION {scenario} {stage}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms")
+        return 1 if flagged else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           build_data.py
+DESCRIPTION:    Build the columnar (Feather) copies of the datasets in data/
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import os
+import sys
+
+# local
+import allocation
+
+
+# Rebuild every data/*.csv whose columnar copy is missing or stale
+def main(data_dir=allocation.DATA_DIR):
+    for file_name in sorted(os.listdir(data_dir)):
+        if not file_name.endswith(".csv"):
+            continue
+        path = os.path.join(data_dir, file_name)
+        if allocation.read_columnar_data(path) is not None:
+            print(f"{file_name}: up to date")
+            continue
+        allocation.build_columnar(path)
+        print(f"{file_name}: built {allocation.columnar_path(path)}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -16,23 +16,25 @@ VERSION:        0.0.1
 # Libraries
 # -------------------------------------------------------------------------
 # python
-import json
 import time
+
+script_started = time.perf_counter()  # first render time, see utils.log_first_render
+
+import json
+import logging
 import base64
-import io
-import zipfile
-import regex as re
+import re
 from datetime import datetime
-import os
 
 # local
+import allocation
 import utils
 
 # 3rd party:
 import streamlit as st
 import pandas as pd
-from streamlit_folium import folium_static
-import folium
+import numpy as np
+import streamlit.components.v1 as components
 
 st.set_page_config(
     page_title="ICB Place Based Allocation Tool",
@@ -45,6 +47,10 @@ st.set_page_config(
         "About": "This tool is designed to support allocation at places by allowing places to be defined by aggregating GP Practices within an ICB. Please refer to the User Guide for instructions. For more information on the latest allocations, including contact details, please refer to: [https://www.england.nhs.uk/allocations/](https://www.england.nhs.uk/allocations/)",
     },
 )
+# Stage timings (allocation/timing.py) are logged as JSON lines to the console
+logging.basicConfig(format="%(asctime)s %(name)s %(message)s")
+logging.getLogger("allocation.timing").setLevel(logging.INFO)
+
 padding = 1
 st.markdown(
     f""" <style>
@@ -59,10 +65,10 @@ st.markdown(
 if len(st.session_state) < 1:
     st.session_state["Default Place"] = {
         "gps": [
-            "B85005: Shepley Health Centre",
-            "B85022: Honley Surgery",
-            "B85061: Skelmanthorpe Family Doctors",
-            "B85026: Kirkburton Health Centre",
+            "B85005",  # Shepley Health Centre
+            "B85022",  # Honley Surgery
+            "B85061",  # Skelmanthorpe Family Doctors
+            "B85026",  # Kirkburton Health Centre
         ],
         "icb": "NHS West Yorkshire ICB",
     }
@@ -71,35 +77,6 @@ if "places" not in st.session_state:
 
 # Functions & Calls
 # -------------------------------------------------------------------------
-# aggregate on a query and set of aggregations
-#Name is the name of the place in the session state, 'aggregations' tells it how to sum each column, 'on' is what to group it by. Not sure what the not in bit is doing. 
-#Query filters to make sure that GP Display (which is the gp name and code joined together by utils) is in the session state place list
-# Function outputs filtered data and grouped, filtered data separately
-def aggregate(data, query, name, on, aggregations):
-    df = data.query(query)
-    if on not in df.columns:
-        df.insert(loc=0, column=on, value=name)
-    df_group = df.groupby(on).agg(aggregations)
-    df_group = df_group.round(0).astype(int)
-    return df, df_group
-
-
-#Calculate index of weighted populations. Take the groupby output fromn the aggregator and divides it by the population number. Do it by icb and place. 
-#get_index(place_groupby, icb_groupby, index_names, index_numerator)
-#place index is divided by icb index to get a relative number
-#overall index is final_wp / gp pop
-def get_index(place_indices, icb_indices, index_names, index_numerator):
-    icb_indices[index_names] = icb_indices[index_numerator].div(
-        icb_indices["GP pop"].values, axis=0
-    )
-    place_indices[index_names] = (
-        place_indices[index_numerator]
-        .div(place_indices["GP pop"].values, axis=0)
-        .div(icb_indices[index_names].values, axis=0)
-    )
-    return place_indices, icb_indices
-
-
 # render svg image
 def render_svg(svg):
     """Renders the given svg string."""
@@ -107,57 +84,6 @@ def render_svg(svg):
     html = r'<img src="data:image/svg+xml;base64,%s"/>' % b64
     st.write(html, unsafe_allow_html=True)
 
-
-# Download functionality
-@st.cache
-def convert_df(df):
-    return df.to_csv(index=False).encode("utf-8")
-
-#Metric calcs. 
-def metric_calcs(group_need_indices, metric_index):
-    place_metric = round(group_need_indices[metric_index][0].astype(float), 2)
-    icb_metric = round(place_metric - 1, 2)
-    return place_metric, icb_metric
-
-
-aggregations = {
-    "GP pop": "sum",
-    "Weighted G&A pop": "sum",
-    "Weighted Community pop": "sum",
-    "Weighted Mental Health pop": "sum",
-    "Weighted Maternity pop": "sum",
-    "Weighted Prescribing pop": "sum",
-    "Overall Weighted pop": "sum",
-    "Weighted Primary Care": "sum",
-    "Weighted Primary Medical Care Need": "sum",
-    "Weighted Health Inequalities pop": "sum",
-}
-
-index_numerator = [
-    "Weighted G&A pop",
-    "Weighted Community pop",
-    "Weighted Mental Health pop",
-    "Weighted Maternity pop",
-    "Weighted Prescribing pop",
-    "Overall Weighted pop",
-    "Weighted Primary Care",
-    "Weighted Primary Medical Care Need",
-    "Weighted Health Inequalities pop",
-]
-
-index_names = [
-    "G&A Index",
-    "Community Index",
-    "Mental Health Index",
-    "Maternity Index",
-    "Prescribing Index",
-    "Overall Core Index",
-    "Primary Medical Care Index",
-    "Primary Medical Care Need Index",
-    "Health Inequalities Index",
-    
-]
-
 # Markdown
 # -------------------------------------------------------------------------
 # NHS Logo
@@ -175,45 +101,113 @@ st.markdown("Last Updated 17th January 2023")
 # SIDEBAR Prologue (have to run before loading data)
 # -------------------------------------------------------------------------
 
-datasets = os.listdir('data/')
+datasets = utils.dataset_files()
+
+selected_dataset = st.sidebar.selectbox("Time Period:", options = datasets, help="Select a time period", format_func=allocation.dataset_year)
+compare_years = st.sidebar.checkbox("Compare all time periods", help="Calculate every place for every time period, with the change in each index from the previous time period")
 
-selected_dataset = st.sidebar.selectbox("Time Period:", options = datasets, help="Select a time period", format_func=lambda x : x.replace('.csv','').replace('_','/'))
+# Time each stage of this rerun, for the logs and the Performance panel
+timer = allocation.StageTimer(dataset=selected_dataset)
 
 # Import Data
 # -------------------------------------------------------------------------
-data_loaded = utils.get_data('data/' + selected_dataset)
-
-data = data_loaded.copy()
+timer.start("data load")
+dataset = utils.get_dataset(utils.dataset_path(selected_dataset))
+# the one copy of the dataset in this process, shared by every session (see allocation.Dataset). Sessions only use
+# its read only arrays and lookups, not the data frame itself.
+practice_index = dataset.practice_index
+hierarchy = dataset.hierarchy
+timer.stop(cache=utils.dataset_cache_status(), practices=len(hierarchy.display))
 
-
-icb = utils.get_sidebar(data)
+timer.start("sidebar")
 
 
 # SIDEBAR Main
 # -------------------------------------------------------------------------
 st.sidebar.subheader("Create New Place")
 
-icb_choice = st.sidebar.selectbox("ICB Filter:", icb, help="Select an ICB")
-
-lad = data["LA District name"].loc[data["ICB name"] == icb_choice].unique().tolist()
+icb_choice = st.sidebar.selectbox("ICB Filter:", hierarchy.icbs, help="Select an ICB")
 
-lad_choice = st.sidebar.multiselect(
-    "Local Authority District Filter:", lad, help="Select a Local Authority District"
-)
-if lad_choice == []:
-    practices = (
-        data["practice_display"].loc[data["ICB name"] == icb_choice].unique().tolist()
-    )
-else:
-    practices = (
-        data["practice_display"].loc[(data["LA District name"].isin(lad_choice)) & (data["ICB name"] == icb_choice)].tolist()
-    )
+# Filters within the ICB, looked up in the dataset's hierarchy. Levels without any names in this ICB aren't shown.
+filter_labels = {
+    "LA District": ("Local Authority District Filter:", "Select a Local Authority District"),
+    "PCN": ("Primary Care Network Filter:", "Select a Primary Care Network"),
+    "Location": ("Location Filter:", "Select an ICB sub-location"),
+}
+filter_choices = {}
+for level, (filter_label, filter_help) in filter_labels.items():
+    level_options = hierarchy.options[level].get(icb_choice, [])
+    if level == "LA District" or level_options:
+        filter_choices[level] = st.sidebar.multiselect(filter_label, level_options, help=filter_help)
+practice_rows = allocation.hierarchy_rows(hierarchy, icb_choice, filter_choices)
+practices = hierarchy.display[practice_rows].tolist()
 
 container_one = st.sidebar.container()
 
 if st.sidebar.button("Select all"):
     st.session_state['multiselect_contents'] = practices
 
+# Select practices by location: within a distance of a point, the nearest practices to it, or inside an area
+# drawn in a GeoJSON file. Only practices in the filters above are selected.
+with st.sidebar.expander("Select by location"):
+    practice_allowed = np.zeros(len(hierarchy.display), dtype=bool)
+    practice_allowed[practice_rows] = True
+    centre = practice_index["lat_long"][practice_allowed].mean(axis=0)
+    latitude = st.number_input("Latitude", value=round(float(centre[0]), 4), format="%.4f")
+    longitude = st.number_input("Longitude", value=round(float(centre[1]), 4), format="%.4f")
+    location_rows = None
+    radius = st.number_input("Distance (km)", min_value=0.1, value=5.0, step=0.5)
+    if st.button("Select within distance"):
+        location_rows = allocation.practices_within(dataset.spatial_index, latitude, longitude, radius)
+    nearest = st.number_input("Number of practices", min_value=1, value=10, step=1)
+    if st.button("Select nearest"):
+        location_rows, _ = allocation.nearest_practices(
+            dataset.spatial_index, latitude, longitude, nearest, practice_allowed
+        )
+    area_file = st.file_uploader("Area as GeoJSON", type=["geojson", "json"])
+    if st.button("Select within area"):
+        if area_file is None:
+            st.error("Please upload a GeoJSON file")
+        else:
+            try:
+                location_rows = allocation.practices_in_polygon(dataset.spatial_index, json.load(area_file))
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                st.error(f"Could not read the area: {e}")
+    if location_rows is not None:
+        location_rows = location_rows[practice_allowed[location_rows]]
+        st.session_state['multiselect_contents'] = hierarchy.display[location_rows].tolist()
+        st.info(f"{len(location_rows)} GP practices selected")
+
+# Built-in places: every PCN, Location, former CCG and LA District in the ICB, already calculated for the whole
+# country when the dataset was loaded (see allocation.build_geographies)
+geographies = dataset.geographies
+with st.sidebar.expander("Built-in places"):
+    geography_levels = [level for level in allocation.geography_levels if geographies.options[level].get(icb_choice)]
+    geography_level = st.selectbox("Geography", geography_levels)
+    geography_label = st.selectbox("Area", geographies.options[geography_level][icb_choice])
+    geography_position, geography_rows = geographies.rows[geography_level, icb_choice, geography_label]
+    geography_name = geographies.table["Place / ICB"].iat[geography_position]
+    st.caption(
+        f"{len(geography_rows)} GP practices, Overall Core Index "
+        f"{geographies.table['Overall Core Index'].iat[geography_position]:.2f}"
+    )
+    if st.button("Select practices", help="Select this area's GP practices to change them before saving"):
+        st.session_state['multiselect_contents'] = hierarchy.display[geography_rows].tolist()
+    if st.button("Add as Place", help="Save this area as a place"):
+        if geography_name in st.session_state.places:
+            st.error(f"There is already a place called {geography_name}")
+        elif geography_name in utils.reserved_names:
+            st.error(f"'{geography_name}' is used by the tool, please save it as a place with another name")
+        else:
+            if st.session_state.places == ["Default Place"]:
+                del [st.session_state["Default Place"]]
+                st.session_state.places = []
+            st.session_state[geography_name] = {
+                "gps": practice_index["codes"][geography_rows].tolist(),
+                "icb": icb_choice,
+            }
+            st.session_state.places = st.session_state.places + [geography_name]
+
 practice_choice = container_one.multiselect(
     "Select GP Practices:",
     practices,
@@ -230,17 +224,19 @@ place_name = st.sidebar.text_input(
 )
 
 if st.sidebar.button("Save Place", help="Save place to session data"):
-    if practice_choice == [] or place_name == "Default Place":
+    if practice_choice == [] or place_name == "Default Place" or place_name in utils.reserved_names:
         if practice_choice == []:
             st.sidebar.error("Please select one or more GP practices")
         if place_name == "Default Place":
             st.sidebar.error(
                 "Please rename your place to something other than 'Default Place'"
             )
+        if place_name in utils.reserved_names:
+            st.sidebar.error(f"'{place_name}' is used by the tool, please give your place another name")
     if place_name == "":
         st.sidebar.error("Please give your place a name")
     else:
-        if practice_choice == [] or place_name == "Default Place":
+        if practice_choice == [] or place_name == "Default Place" or place_name in utils.reserved_names:
             print("")
         else:
             if (
@@ -251,7 +247,7 @@ if st.sidebar.button("Save Place", help="Save place to session data"):
                 del [st.session_state.places[0]]
                 if [place_name] not in st.session_state:
                     st.session_state[place_name] = {
-                        "gps": practice_choice,
+                        "gps": [allocation.practice_code(gp) for gp in practice_choice],
                         "icb": icb_choice,
                     }
                 if "places" not in st.session_state:
@@ -261,7 +257,7 @@ if st.sidebar.button("Save Place", help="Save place to session data"):
             else:
                 if [place_name] not in st.session_state:
                     st.session_state[place_name] = {
-                        "gps": practice_choice,
+                        "gps": [allocation.practice_code(gp) for gp in practice_choice],
                         "icb": icb_choice,
                     }
                 if "places" not in st.session_state:
@@ -276,41 +272,52 @@ for key, value in session_state_dict.items():
     session_state_dict[key] = st.session_state[key]
 session_state_dict["places"] = st.session_state.places
 
-session_state_dump = json.dumps(session_state_dict, indent=4, sort_keys=False)
-
 # Use file uploaded to read in groups of practices
 advanced_options = st.sidebar.checkbox("Advanced Options")
 if advanced_options:
-    # downloads
+    # downloads, places saved with practice codes (see docs/json_format_primer.md)
+    compress_session = st.sidebar.checkbox("Compress session file", help="Save the session data as a smaller .json.gz file")
     st.sidebar.download_button(
         label="Download session data as JSON",
-        data=session_state_dump,
-        file_name="session.json",
-        mime="text/json",
+        data=allocation.dump_session(session_state_dict, compress=compress_session),
+        file_name="session.json.gz" if compress_session else "session.json",
+        mime="application/gzip" if compress_session else "text/json",
     )
     # uploads
     form = st.sidebar.form(key="my-form")
     group_file = form.file_uploader(
-        "Upload previous session data as JSON", type=["json"]
+        "Upload previous session data as JSON", type=["json", "gz"]
     )
     submit = form.form_submit_button("Submit")
     if submit:
         if group_file is not None:
-            d = json.load(group_file)
-            st.session_state.places = d["places"]
-            for place in d["places"]:
-                st.session_state[place] = d[place]
-            my_bar = st.sidebar.progress(0)
-            for percent_complete in range(100):
-                time.sleep(0.01)
-                my_bar.progress(percent_complete + 1)
-            my_bar.empty()
+            # checked and matched to this time period's practices in one go, then loaded in one step
+            try:
+                report = allocation.resolve_session(allocation.read_session(group_file.getvalue()), dataset)
+            except allocation.SessionError as e:
+                st.sidebar.error(f"Could not load the session file: {e}")
+            else:
+                # places named like the dashboard's own session state keys would overwrite them
+                refused = [place for place in report.session["places"] if place in utils.reserved_names]
+                if refused:
+                    st.sidebar.error(f"Places not loaded, their names are used by the tool: {', '.join(refused)}")
+                session = allocation.without_places(report.session, refused)
+                if session["places"]:
+                    st.session_state.update(session)
+                if report.ok:
+                    st.sidebar.success(report.summary())
+                elif report.unknown_icbs:
+                    st.sidebar.error(report.summary())
+                else:
+                    st.sidebar.warning(report.summary())
 
 see_session_data = st.sidebar.checkbox("Show Session Data")
+see_performance = st.sidebar.checkbox("Show Performance", help="Time taken by each stage of the last update")
 
 # BODY
 # -------------------------------------------------------------------------
 
+timer.start("select place")
 select_index = len(st.session_state.places) - 1  # find n-1 index
 placeholder = st.empty()
 option = placeholder.selectbox(
@@ -324,17 +331,16 @@ if "after" not in st.session_state:
 
 label = "Delete Current Selection"
 delete_place = st.button(label, help=label)
-my_bar_delete = st.empty()
 if delete_place:
     if len(st.session_state.places) <= 1:
         del [st.session_state[st.session_state.after]]
         if "Default Group" not in st.session_state:
             st.session_state["Default Place"] = {
                 "gps": [
-                    "B85005: Shepley Health Centre",
-                    "B85022: Honley Surgery",
-                    "B85061: Skelmanthorpe Family Doctors",
-                    "B85026: Kirkburton Health Centre",
+                    "B85005",  # Shepley Health Centre
+                    "B85022",  # Honley Surgery
+                    "B85061",  # Skelmanthorpe Family Doctors
+                    "B85026",  # Kirkburton Health Centre
                 ],
                 "icb": "NHS West Yorkshire ICB",
             }
@@ -343,10 +349,10 @@ if delete_place:
         else:
             st.session_state["Default Place"] = {
                 "gps": [
-                    "B85005: Shepley Health Centre",
-                    "B85022: Honley Surgery",
-                    "B85061: Skelmanthorpe Family Doctors",
-                    "B85026: Kirkburton Health Centre",
+                    "B85005",  # Shepley Health Centre
+                    "B85022",  # Honley Surgery
+                    "B85061",  # Skelmanthorpe Family Doctors
+                    "B85026",  # Kirkburton Health Centre
                 ],
                 "icb": "NHS West Yorkshire ICB",
             }
@@ -355,11 +361,6 @@ if delete_place:
         st.warning(
             "All places deleted. 'Default Place' reset to default. Please create a new place."
         )
-        my_bar_delete.progress(0)
-        for percent_complete in range(100):
-            time.sleep(0.01)
-            my_bar_delete.progress(percent_complete + 1)
-        my_bar_delete.empty()
     else:
         del [st.session_state[st.session_state.after]]
         del [
@@ -367,11 +368,6 @@ if delete_place:
                 st.session_state.places.index(st.session_state.after)
             ]
         ]
-        my_bar_delete.progress(0)
-        for percent_complete in range(100):
-            time.sleep(0.01)
-            my_bar_delete.progress(percent_complete + 1)
-        my_bar_delete.empty()
 
 select_index = len(st.session_state.places) - 1  # find n-1 index
 option = placeholder.selectbox(
@@ -382,92 +378,63 @@ group_gp_list = st.session_state[st.session_state.after]["gps"]
 
 # MAP
 # -------------------------------------------------------------------------
+timer.start("map", practices=len(group_gp_list))
 
-map = folium.Map(location=[52, 0], zoom_start=10, tiles="openstreetmap")
-lat = []
-long = []
-
+# places hold practice codes (or display strings, from older session files)
+available = []
+group_gp_names = []
 for gp in group_gp_list:
-    if ~data["practice_display"].str.contains(gp).any():
+    row = practice_index["code"].get(gp, practice_index["display"].get(gp))
+    if row is None:
         st.write(f"{gp} is not available in this time period")
-        continue
-    latitude = data["Latitude"].loc[data["practice_display"] == gp].item()
-    longitude = data["Longitude"].loc[data["practice_display"] == gp].item()
-    lat.append(latitude)
-    long.append(longitude)
-    folium.Marker(
-        [latitude, longitude],
-        popup=str(gp),
-        icon=folium.Icon(color="darkblue", icon="fa-user-md", prefix="fa"),
-    ).add_to(map)
-
-
-if not lat:
+        group_gp_names.append(gp)
+    else:
+        available.append(hierarchy.display[row])
+        group_gp_names.append(hierarchy.display[row])
+
+if not available:
     st.write("No GP Practices in this Place are available in this time period")
+    timer.stop()
     st.stop()
 
-# bounds method https://stackoverflow.com/a/58185815
-map.fit_bounds(
-    [[min(lat) - 0.02, min(long)], [max(lat) + 0.02, max(long)]]
-)  # add buffer to north
-# call to render Folium map in Streamlit
-folium_static(map, width=700, height=300)
+# call to render the map in Streamlit, cached per dataset and practice set
+components.html(
+    utils.get_map_html(dataset.content_hash, tuple(sorted(set(available))), practice_index),
+    width=700,
+    height=310,
+)
 
 # Group GP practice display
 list_of_gps = re.sub(
-    "\w+:",
+    r"\w+:",
     "",
-    str(group_gp_list).replace("'", "").replace("[", "").replace("]", ""),
+    str(group_gp_names).replace("'", "").replace("[", "").replace("]", ""),
 )
 st.info("**Selected GP Practices: **" + list_of_gps)
 
-gp_query = "practice_display == @place_state"
-icb_query = "`ICB name` == @icb_state"  # escape column names with backticks https://stackoverflow.com/a/56157729
+#EVERY PLACE in the SESSION STATE is aggregated and indexed against its ICB. Result rows are kept in the session,
+#so only places saved or changed since the last rerun are calculated (all of them after a Time Period change)
+tool_state = utils.tool_state()
+if "place_results" not in tool_state:
+    tool_state["place_results"] = allocation.SessionResults()
 
-# dict to store all dfs sorted by ICB
-dict_obj = {}
-df_list = []
-
-
-
-#FOR EACH PLACE in the SESSION STATE aggregate the data at the ICB and Place level, calculate indices 
-#adds them to a dictionary object
-
-for place in st.session_state.places:
-    place_state = st.session_state[place]["gps"]
-    icb_state = st.session_state[place]["icb"]
-        
-        # get place aggregations
-    place_data, place_groupby = aggregate(
-        data, gp_query, place, "Place Name", aggregations
-    )
-    # get ICB aggregations
-    icb_data, icb_groupby = aggregate(
-        data, icb_query, icb_state, "ICB name", aggregations
-    )
-
-
-    # index calcs
-    place_indices, icb_indices = get_index(
-        place_groupby, icb_groupby, index_names, index_numerator
-    )
-
-    icb_indices.insert(loc=0, column="Place / ICB", value=icb_state)
-    place_indices.insert(loc=0, column="Place / ICB", value=place)
-
-    if icb_state not in dict_obj:
-        dict_obj[icb_state] = [icb_indices, place_indices]
-    else:
-        dict_obj[icb_state].append(place_indices)
+session_state_dict = dict.fromkeys(st.session_state.places, [])
+for key, value in session_state_dict.items():
+    session_state_dict[key] = st.session_state[key]
+session_state_dict["places"] = st.session_state.places
 
-# add dict values to list
-for obj in dict_obj:
-    df_list.append(dict_obj[obj])
+timer.start(
+    "places",
+    places=len(st.session_state.places),
+    practices=sum(len(st.session_state[place]["gps"]) for place in st.session_state.places),
+)
+large_df = tool_state["place_results"].update(session_state_dict, dataset)
+timer.stop(recomputed=tool_state["place_results"].recomputed)
 
-# flaten list for concatination
-flat_list = [item for sublist in df_list for item in sublist]
-large_df = pd.concat(flat_list, ignore_index=True)
-large_df = large_df.round(decimals=3)
+if compare_years:
+    timer.start("comparison", places=len(st.session_state.places))
+    year_stack = utils.get_year_stack(tuple(utils.dataset_path(f) for f in sorted(datasets)))
+    comparison_df = allocation.compare_places(session_state_dict, year_stack)
 
 # "Weighted G&A pop",
 # "Weighted Community pop",
@@ -530,6 +497,7 @@ large_df = large_df.round(decimals=3)
 
 # Metrics
 # -------------------------------------------------------------------------
+timer.start("metrics")
 
 df = large_df.loc[large_df["Place / ICB"] == st.session_state.after]
 df = df.reset_index(drop=True)
@@ -553,7 +521,7 @@ metric_names = [
     "Health Inequals",
 ]
 
-place_metric, icb_metric = metric_calcs(df, "Overall Core Index")
+place_metric, icb_metric = allocation.metric_calcs(df, "Overall Core Index")
 place_metric = "{:.2f}".format(place_metric)
 st.header("Core Index: " + str(place_metric))
 st.caption("For relative weighting of components, see the 2nd rows in [workbook J](https://www.england.nhs.uk/wp-content/uploads/2022/04/j-overall-weighted-populations-22-23.xlsx) tabs 'ICB weighted population' and 'GP weighted population'.")
@@ -562,7 +530,7 @@ with st.expander("Core Sub Indices", expanded  = True):
 
     cols = st.columns(len(metric_cols))
     for metric, name in zip(metric_cols, metric_names):
-        place_metric, icb_metric = metric_calcs(
+        place_metric, icb_metric = allocation.metric_calcs(
             df,
             metric,
         )
@@ -583,7 +551,7 @@ metric_names = [
     "Primary Medical Care Need***",
     "Health Inequals",
 ]
-place_metric, icb_metric = metric_calcs(df, "Primary Medical Care Index")
+place_metric, icb_metric = allocation.metric_calcs(df, "Primary Medical Care Index")
 place_metric = "{:.2f}".format(place_metric)
 st.header("Primary Medical Care Index: " + str(place_metric))
 st.caption("Based on weighted populations from the formula for ICB allocations, not the global sum weighted populations**")
@@ -592,7 +560,7 @@ with st.expander("Primary Medical Care Sub Indices", expanded  = True):
 
     cols = st.columns(3)
     for metric, name in zip(metric_cols, metric_names):
-        place_metric, icb_metric = metric_calcs(
+        place_metric, icb_metric = allocation.metric_calcs(
             df,
             metric,
         )
@@ -602,6 +570,61 @@ with st.expander("Primary Medical Care Sub Indices", expanded  = True):
             place_metric,  # icb_metric, delta_color="inverse"
         )
 
+# What If
+# -------------------------------------------------------------------------
+#Add or remove single practices from the selected place and see its indices change before saving it. The what-if
+#keeps running sums, so each change only adds or takes away one practice's row (see allocation.WhatIf)
+with st.expander("What If: add or remove GP practices"):
+    timer.start("what if")
+    what_if_key = (dataset.content_hash, st.session_state.after, tuple(group_gp_list), icb_name)
+    if tool_state.get("what_if_key") != what_if_key:
+        tool_state["what_if_key"] = what_if_key
+        tool_state["what_if"] = allocation.WhatIf.from_place(dataset, group_gp_list, icb_name)
+    what_if = tool_state["what_if"]
+
+    what_if_practice = st.selectbox(
+        "GP Practice in " + icb_name, hierarchy.display[hierarchy.rows[icb_name]], key="what_if_practice"
+    )
+    what_if_row = practice_index["display"][what_if_practice]
+    what_if_cols = st.columns(3)
+    if what_if_cols[0].button("Add / Remove Practice"):
+        what_if.toggle(what_if_row)
+    if what_if_cols[1].button("Reset"):
+        tool_state["what_if"] = what_if = allocation.WhatIf.from_place(dataset, group_gp_list, icb_name)
+    # saved in a callback, so the rerun that follows calculates the place with its new practices. Only the changes
+    # are applied, so practices of the place that aren't in this Time Period are kept
+    def save_what_if():
+        place = st.session_state[st.session_state.after]
+        place["gps"] = tool_state["what_if"].apply(practice_index, place["gps"])
+
+    what_if_cols[2].button(
+        "Save Changes to Place", on_click=save_what_if, disabled=not what_if.changes or not what_if.members
+    )
+
+    for row, added in what_if.changes.items():
+        st.write(("Added " if added else "Removed ") + hierarchy.display[row])
+    st.caption(
+        f"{len(what_if.members)} GP practices. Changes from the saved place are shown under each index."
+    )
+    what_if_metrics = what_if.metrics()
+    cols = st.columns(3)
+    for position, metric in enumerate(allocation.index_names):
+        value, change = what_if_metrics[metric]
+        cols[position % 3].metric(metric, "{:.2f}".format(value), "{:+.2f}".format(change), delta_color="off")
+    timer.stop(practices=len(what_if.members), changes=len(what_if.changes))
+
+# identifies this session's results, e.g. for the preview and download caches
+session_state_dump = allocation.dump_session(session_state_dict)
+
+# Time Period Comparison
+# -------------------------------------------------------------------------
+if compare_years:
+    timer.start("comparison table")
+    st.subheader("Time Period Comparison")
+    st.caption("Every place and ICB for each time period. Practices are matched on practice code across time periods, and the change columns are the difference in each index from the previous time period.")
+    with st.container():
+        utils.write_preview(comparison_df, "comparison", ("comparison", tuple(datasets), session_state_dump))
+
 # Downloads
 # -------------------------------------------------------------------------
 current_date = datetime.now().strftime("%Y-%m-%d")
@@ -610,49 +633,48 @@ st.subheader("Download Data")
 
 print_table = st.checkbox("Preview data download", value=True)
 if print_table:
+    timer.start("table")
+    preview_table = st.radio("Table", ["Your places", "All built-in places"], horizontal=True)
     with st.container():
-        utils.write_table(large_df)
-
-# csv_header = b'WARNING: this is a warning message'
-
-
-csv_header1 = b"\"PLEASE READ: Below you can find the results for the places you created, and for the ICB they belong to, for the year you selected.\""
-csv_header2 = b"\"Note that the need indices for the places are relative to the ICB (where the ICBs need index = 1.00), while the need index for the ICB is relative to national need (where the national need index = 1.00).\""
-csv_header3 = b"\"This means that the need indices of the individual places cannot be compared to the need index of the ICB. For more information, see the user guide available from https://www.england.nhs.uk/allocations/.\""
-csv_header4 = b"\"\""
-
-wf = convert_df(large_df)
-
-full_csv = b'\n'.join([csv_header1, csv_header2, csv_header3, csv_header4,  wf])
-
-with open("docs/ICB allocation tool documentation.txt", "rb") as fh:
-    readme_text = io.BytesIO(fh.read())
+        if preview_table == "Your places":
+            utils.write_preview(large_df, "places", (dataset.content_hash, session_state_dump))
+        else:
+            utils.write_preview(dataset.geographies.table, "geographies", (dataset.content_hash, "geographies"))
+
+st.download_button(
+    label="Download all built-in places (CSV)",
+    data=utils.get_geography_csv(dataset.content_hash, dataset.geographies.table),
+    file_name=f"ICB allocation built-in places {selected_dataset}",
+    mime="text/csv",
+    help="Every PCN, Location, former CCG and LA District in the country, with indices relative to their ICB",
+)
 
-session_state_dict = dict.fromkeys(st.session_state.places, [])
-for key, value in session_state_dict.items():
-    session_state_dict[key] = st.session_state[key]
-session_state_dict["places"] = st.session_state.places
-session_state_dump = json.dumps(session_state_dict, indent=4, sort_keys=False)
-
-# https://stackoverflow.com/a/44946732
-zip_buffer = io.BytesIO()
-with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
-    for file_name, data in [
-        (f"ICB allocation calculations {selected_dataset}", io.BytesIO(full_csv)),
-        ("ICB allocation tool documentation.txt", readme_text),
-        (
-            "ICB allocation tool configuration file.json",
-            io.StringIO(session_state_dump),
-        ),
-    ]:
-        zip_file.writestr(file_name, data.getvalue())
+export_format = st.selectbox(
+    "Download format",
+    list(allocation.export_formats),
+    help="ZIP: the calculations as CSV with the documentation and this session's configuration file. Excel: one sheet per ICB. Parquet: the calculations table only.",
+)
+extension, mime = allocation.export_formats[export_format]
+
+timer.start("export", format=extension)
+export_bytes = utils.get_export(
+    export_format,
+    dataset.content_hash,
+    selected_dataset,
+    session_state_dump,
+    compare_years,
+    large_df,
+    dataset.icb_table.index,
+    comparison_df if compare_years else None,
+)
 
 btn = st.download_button(
-    label="Download ZIP",
-    data=zip_buffer.getvalue(),
-    file_name="ICB allocation tool %s.zip" % current_date,
-    mime="application/zip",
+    label="Download " + extension.upper(),
+    data=export_bytes,
+    file_name="ICB allocation tool %s.%s" % (current_date, extension),
+    mime=mime,
 )
+timer.stop()
 
 st.subheader("Help and Support")
 with st.expander("About the ICB Place Based Allocation Tool"):
@@ -696,4 +718,16 @@ if see_session_data:
     st.subheader("Session Data")
     st.session_state
 
+# Show Performance
+# -------------------------------------------------------------------------
+if see_performance:
+    st.sidebar.subheader("Performance")
+    timings = pd.DataFrame(
+        [{key: str(value) for key, value in record.items() if key != "dataset"} for record in timer.records]
+    )
+    st.sidebar.table(timings.set_index("stage").fillna(""))
+    st.sidebar.caption(f"Total {timer.total():.0f} ms for {selected_dataset}")
+    st.sidebar.caption(f"First render after start up: {utils.log_first_render(script_started) * 1000:.0f} ms")
 
+# the first rerun in this process logs its time to first render
+utils.log_first_render(script_started)
@@ -0,0 +1,253 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           ingest_workbook.py
+DESCRIPTION:    Write the per-year datasets in data/ from the GP practice weighted population workbook
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+
+# 3rd party:
+import openpyxl
+
+# local
+import allocation
+
+# Bump when the output format changes so unchanged sheets are still rebuilt
+INGEST_VERSION = "1"
+
+MANIFEST = "ingest_manifest.json"
+
+# Year-specific workbook headers mapped to the (fixed) CSV headers that get_data renames
+column_aliases = [
+    (r"CCG\d\d", "CCG21"),
+    (r"(ICS|ICB)\d\d", "ICS22"),
+    (r"(ICS|ICB)\d\dname", "ICS22name"),
+    (r"LOC\d\d", "LOC22"),
+    (r"LOC\d\dname", "LOC22name"),
+    (r"R\d\d", "R22"),
+    (r"Region\d\d", "Region22"),
+    (r"pop \d{4}/\d\d", "pop 2022/23"),
+    (r"Primary Medical Care (need|WP)", "Primary Medical Care WP"),
+]
+
+# Taken from the workbook. Everything else (names, coordinates and geography) comes from the lookup dataset
+measure_columns = [
+    "Patients",
+    "pop 2022/23",
+    "G&A WP",
+    "CS WP",
+    "MH WP",
+    "Mat WP",
+    "Health Ineq WP",
+    "Prescr WP",
+    "Final WP",
+    "Primary Medical Care WP",
+    "Final PMC WP",
+]
+
+# Column order of the CSVs in data/
+csv_columns = list(allocation.rename_columns)
+csv_columns[csv_columns.index("Practice_Postcode") + 1 : 0] = ["Latitude", "Longitude"]
+
+
+class IngestError(Exception):
+    pass
+
+
+def normalise_header(header):
+    header = " ".join(str(header).split())
+    for pattern, column in column_aliases:
+        if re.fullmatch(pattern, header):
+            return column
+    return header
+
+
+# Sheet GP_wp_202324 -> 2023_2024.csv
+def output_name(sheet_name):
+    match = re.search(r"(\d\d)(\d\d)$", sheet_name)
+    if match is None:
+        return sheet_name + ".csv"
+    return f"20{match.group(1)}_20{match.group(2)}.csv"
+
+
+# Header of a sheet checked against the rename map in get_data
+def validate_header(sheet_name, header):
+    unknown = [column for column in header if column not in allocation.rename_columns]
+    missing = [column for column in ["Practice_Code"] + measure_columns if column not in header]
+    if unknown or missing:
+        raise IngestError(
+            f"{sheet_name}: unrecognised columns {unknown}, missing columns {missing}"
+        )
+
+
+# Practice attributes (every CSV column except the measures) by practice code
+def read_lookup(path):
+    with open(path, newline="") as fh:
+        reader = csv.DictReader(fh)
+        missing = [column for column in csv_columns if column not in reader.fieldnames]
+        if missing:
+            raise IngestError(f"{path}: lookup is missing columns {missing}")
+        return {
+            row["Practice_Code"]: {
+                column: row[column] for column in csv_columns if column not in measure_columns
+            }
+            for row in reader
+        }
+
+
+# Newest dataset in data/, the default lookup for a new year
+def latest_dataset(output_dir):
+    paths = sorted(glob.glob(os.path.join(output_dir, "*.csv")))
+    return paths[-1] if paths else None
+
+
+# Stream one sheet into a CSV (written to a temporary file first). Returns the sheet hash and practices
+# that aren't in the lookup.
+def write_sheet(rows, sheet_name, lookup, dest):
+    sha = hashlib.sha256(INGEST_VERSION.encode())
+    header = [normalise_header(column) for column in next(rows, ())]
+    validate_header(sheet_name, header)
+    unmatched = []
+    with open(dest, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(csv_columns)
+        for values in rows:
+            if all(value is None for value in values):
+                continue
+            sha.update(repr(values).encode())
+            row = dict(zip(header, values))
+            attributes = lookup.get(row["Practice_Code"])
+            if attributes is None:
+                unmatched.append(row["Practice_Code"])
+                attributes = row
+            writer.writerow(
+                [
+                    row.get(column) if column in measure_columns else attributes.get(column)
+                    for column in csv_columns
+                ]
+            )
+    return sha.hexdigest(), unmatched
+
+
+def ingest(workbook_path, output_dir=allocation.DATA_DIR, lookup_path=None, force=False):
+    # the manifest records the workbook by its full path, so runs from any directory match
+    workbook_path = os.path.abspath(workbook_path)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+    lookup_hash = allocation.file_hash(lookup_path) if lookup_path else None
+
+    # unchanged workbook: nothing to open
+    workbook_hash = allocation.file_hash(workbook_path)
+    built = [name for name, entry in manifest.items() if entry["workbook"] == workbook_path]
+    if not force and built and all(
+        manifest[name]["workbook_sha256"] == workbook_hash
+        and manifest[name]["lookup_sha256"] == lookup_hash
+        and os.path.exists(os.path.join(output_dir, name))
+        for name in built
+    ):
+        print(f"{workbook_path}: unchanged, {len(built)} datasets up to date")
+        return []
+
+    written = []
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            start = time.perf_counter()
+            name = output_name(sheet.title)
+            dest = os.path.join(output_dir, name)
+            # an existing dataset is its own lookup, so rebuilding it only updates the measures
+            source = lookup_path or (dest if os.path.exists(dest) else latest_dataset(output_dir))
+            if source is None:
+                raise IngestError(f"{sheet.title}: no lookup dataset, pass --lookup")
+            tmp = dest + ".tmp"
+            sheet_hash, unmatched = write_sheet(
+                sheet.iter_rows(values_only=True), sheet.title, read_lookup(source), tmp
+            )
+            entry = manifest.get(name, {})
+            if (
+                not force
+                and entry.get("sheet_sha256") == sheet_hash
+                and entry.get("lookup_sha256") == lookup_hash
+                and os.path.exists(dest)
+            ):
+                os.remove(tmp)
+                print(f"{sheet.title}: unchanged ({name})")
+            else:
+                os.replace(tmp, dest)
+                allocation.build_columnar(dest)
+                written.append(dest)
+                print(f"{sheet.title}: wrote {dest} in {time.perf_counter() - start:.2f}s")
+            if unmatched:
+                print(
+                    f"{sheet.title}: {len(unmatched)} practices not in {source}, "
+                    f"names and geography taken from the workbook: {', '.join(unmatched[:10])}",
+                    file=sys.stderr,
+                )
+            manifest[name] = {
+                "workbook": workbook_path,
+                "workbook_sha256": workbook_hash,
+                "sheet": sheet.title,
+                "sheet_sha256": sheet_hash,
+                "lookup_sha256": lookup_hash,
+            }
+    finally:
+        workbook.close()
+
+    with open(manifest_path, "w") as fh:
+        json.dump(manifest, fh, indent=4)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write the per-year datasets in data/ from the GP practice weighted population workbook"
+    )
+    parser.add_argument(
+        "workbook",
+        nargs="?",
+        default=os.path.join(allocation.ROOT_DIR, "raw_data", "GP Practice WP_2023_2024_2025.xlsx"),
+        help="workbook with one sheet per year, e.g. GP_wp_202324",
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default=allocation.DATA_DIR, help="where the datasets are written"
+    )
+    parser.add_argument(
+        "-l",
+        "--lookup",
+        help="dataset CSV to take practice names, coordinates and geography from "
+        "(default: the existing dataset for the year, or the newest dataset for a new year)",
+    )
+    parser.add_argument("-f", "--force", action="store_true", help="rebuild even if the workbook is unchanged")
+    args = parser.parse_args(argv)
+    try:
+        ingest(args.workbook, args.output_dir, args.lookup, args.force)
+    except IngestError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           load_test.py
+DESCRIPTION:    Load test of the place calculation HTTP service (api.py) on localhost
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# 3rd party:
+import numpy as np
+import pandas as pd
+
+# local
+import allocation
+
+
+# Request bodies of n_places random places each, as lists of {"place", "icb", "practices"}
+def random_requests(dataset, n_requests, n_places, seed=0):
+    rnd = random.Random(seed)
+    codes = dataset.practice_index["codes"]
+    icbs = dataset.hierarchy.icbs
+    requests = []
+    for _ in range(n_requests):
+        places = []
+        for number in range(n_places):
+            icb = rnd.choice(icbs)
+            rows = dataset.hierarchy.rows[icb]
+            chosen = rnd.sample(list(rows), min(len(rows), rnd.randint(1, 40)))
+            places.append({"place": f"Place {number}", "icb": icb, "practices": [codes[row] for row in chosen]})
+        requests.append(places)
+    return requests
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        data = response.read()
+    return time.perf_counter() - start, data
+
+
+def get_json(url):
+    with urllib.request.urlopen(url) as response:
+        return json.loads(response.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("DESCRIPTION:")[1].split("\n")[0].strip())
+    parser.add_argument("--url", default="http://127.0.0.1:8502", help="address of the running api.py")
+    parser.add_argument(
+        "-d",
+        "--dataset",
+        default=os.path.join(allocation.DATA_DIR, "2023_2024.csv"),
+        help="dataset the places are drawn from",
+    )
+    parser.add_argument("-n", "--requests", type=int, default=500, help="number of requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--places", type=int, default=5, help="places in each request")
+    parser.add_argument(
+        "--check", action="store_true", help="compare the responses with allocation.compute_places"
+    )
+    args = parser.parse_args(argv)
+
+    dataset = allocation.load_dataset(args.dataset)
+    year = allocation.dataset_year(dataset.name)
+    requests = random_requests(dataset, args.requests, args.places)
+    bodies = [json.dumps({"places": places, "years": [year]}).encode("utf-8") for places in requests]
+    try:
+        before = get_json(args.url + "/health")
+    except urllib.error.URLError as e:
+        print(f"no service at {args.url} ({e.reason}), start it with: python api.py", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda body: post(args.url + "/places", body), bodies))
+    elapsed = time.perf_counter() - start
+    after = get_json(args.url + "/health")
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    batches = after["batches"] - before["batches"]
+    print(
+        f"{args.requests} requests of {args.places} places, {args.concurrency} at once: "
+        f"{args.requests / elapsed:,.0f} requests/s, latency p50 {np.percentile(latencies, 50):.1f} ms, "
+        f"p95 {np.percentile(latencies, 95):.1f} ms, max {latencies.max():.1f} ms"
+    )
+    print(
+        f"{batches} batches on the server ({(after['batched requests'] - before['batched requests']) / max(batches, 1):.1f} "
+        "requests per batch)"
+    )
+
+    if args.check:
+        columns = list(allocation.aggregations) + allocation.index_names
+        for places, (_, data) in zip(requests, results):
+            session = {"places": [place["place"] for place in places]}
+            session.update({place["place"]: {"gps": place["practices"], "icb": place["icb"]} for place in places})
+            expected = allocation.compute_places(session, dataset)
+            received = pd.DataFrame(json.loads(data))
+            pd.testing.assert_frame_equal(
+                received[["Place / ICB"] + columns], expected[["Place / ICB"] + columns], check_dtype=False
+            )
+        print(f"all {len(results)} responses match allocation.compute_places")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,475 @@
+# -------------------------------------------------------------------------
+# Copyright (c) 2021 NHS England and NHS Improvement. All rights reserved.
+# Licensed under the MIT License and the Open Government License v3. See
+# license.txt in the project root for license information.
+# -------------------------------------------------------------------------
+
+"""
+FILE:           session_load_test.py
+DESCRIPTION:    Response time and memory of the running dashboard under many simultaneous sessions, without a browser
+CONTACT:        england.revenue-allocations@nhs.net
+CREATED:        2026-10-17
+VERSION:        0.0.1
+"""
+
+# Libraries
+# -------------------------------------------------------------------------
+# python
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+# 3rd party:
+import numpy as np
+import streamlit
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest
+from tornado.websocket import websocket_connect
+
+# local
+import allocation
+
+APP = os.path.join(allocation.ROOT_DIR, "dashboard.py")
+
+# The user journey each simulated session repeats, one rerun per step. "advanced options" opens the sidebar's
+# Advanced Options (once per session), "upload session" downloads the session file and uploads it again.
+steps = ["open", "pick ICB", "select all", "save place", "switch year", "advanced options", "upload session"]
+
+# Where each widget's value is kept in its WidgetState, for the widgets the journey sets
+value_fields = {
+    "selectbox": "int_value",
+    "checkbox": "bool_value",
+    "text_input": "string_value",
+    "multiselect": "int_array_value",
+}
+
+# Sidebar elements have delta paths starting with 1 (RootContainer.SIDEBAR)
+SIDEBAR = 1
+
+
+# The script couldn't be run (a syntax error)
+class ScriptError(Exception):
+    pass
+
+
+# One browser tab on a running Streamlit server, speaking its websocket protocol (as the Streamlit frontend does):
+# each rerun sends the values of the widgets on the page, with the buttons clicked, and reads the page back up to
+# the end of the script. Widget values the script sets through the session state are taken from the page, and
+# values of widgets no longer on the page are dropped.
+class AppClient:
+    def __init__(self, url):
+        self.url = url
+        self.http = AsyncHTTPClient()
+        self.session_id = None
+        self.page_script_hash = ""
+        self.values = {}
+        self.elements = {}
+        self.message_cache = {}
+
+    async def connect(self):
+        ws_url = "ws" + self.url[len("http"):] + "/stream"
+        self.websocket = await websocket_connect(ws_url, max_message_size=1 << 30)
+
+    def close(self):
+        self.websocket.close()
+
+    # Reruns the script with the widget values set so far and the given buttons clicked; returns when it ends
+    async def rerun(self, clicked=()):
+        states = list(self.values.values())
+        states += [WidgetState(id=widget_id, trigger_value=True) for widget_id in clicked]
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = self.page_script_hash
+        message.rerun_script.widget_states.widgets.extend(states)
+        self.elements = {}
+        await self.websocket.write_message(message.SerializeToString(), binary=True)
+        while True:
+            data = await self.websocket.read_message()
+            if data is None:
+                raise ConnectionError("the server closed the session")
+            message = await self.read(data)
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                self.session_id = message.new_session.initialize.session_id
+                self.page_script_hash = message.new_session.page_script_hash
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                element = message.delta.new_element
+                self.elements[tuple(message.metadata.delta_path)] = (element.WhichOneof("type"), element)
+            elif kind == "script_finished":
+                if message.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise ScriptError("the script has a syntax error")
+                if message.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    break
+        self.update_values()
+
+    # A ForwardMsg, with messages the server sent earlier as a reference (ref_hash) taken from the cache
+    async def read(self, data):
+        message = ForwardMsg()
+        message.ParseFromString(data)
+        if message.metadata.cacheable:
+            self.message_cache[message.hash] = message
+        if message.WhichOneof("type") != "ref_hash":
+            return message
+        cached = self.message_cache.get(message.ref_hash)
+        if cached is None:
+            response = await self.http.fetch(f"{self.url}/message?hash={message.ref_hash}")
+            cached = ForwardMsg()
+            cached.ParseFromString(response.body)
+            self.message_cache[message.ref_hash] = cached
+        resolved = ForwardMsg()
+        resolved.CopyFrom(cached)
+        resolved.metadata.CopyFrom(message.metadata)
+        return resolved
+
+    def update_values(self):
+        on_page = set()
+        for kind, widget in self.widgets():
+            on_page.add(widget.id)
+            if kind in value_fields and widget.set_value:
+                self.set_value(widget, widget.value)
+        self.values = {widget_id: state for widget_id, state in self.values.items() if widget_id in on_page}
+
+    def widgets(self):
+        for kind, element in self.elements.values():
+            widget = getattr(element, kind)
+            if hasattr(widget, "id") and hasattr(widget, "label"):
+                yield kind, widget
+
+    def widget(self, label, kind=None):
+        for widget_kind, widget in self.widgets():
+            if widget.label == label and kind in (None, widget_kind):
+                return widget
+        raise LookupError(f"no widget {label!r} on the page")
+
+    def set_value(self, widget, value):
+        kind = next(kind for kind, on_page in self.widgets() if on_page.id == widget.id)
+        state = WidgetState(id=widget.id)
+        if kind == "multiselect":
+            state.int_array_value.data.extend(value)
+        else:
+            setattr(state, value_fields[kind], value)
+        self.values[widget.id] = state
+
+    # Texts of the alerts (st.error, st.warning, ...) and exceptions shown by the last rerun
+    def alerts(self, sidebar_only=False):
+        found = []
+        for path, (kind, element) in self.elements.items():
+            if sidebar_only and path[0] != SIDEBAR:
+                continue
+            if kind == "alert":
+                found.append((element.alert.format, element.alert.body))
+            elif kind == "exception":
+                found.append(("exception", f"{element.exception.type}: {element.exception.message}"))
+        return found
+
+    async def download(self, label):
+        button = self.widget(label, "download_button")
+        response = await self.http.fetch(self.url + button.url)
+        return response.body
+
+    # Uploads a file to a file uploader, as the frontend does before sending the uploader's new value
+    async def upload(self, widget, name, data):
+        boundary = uuid.uuid4().hex
+        body = b"".join(
+            [
+                f'--{boundary}\r\nContent-Disposition: form-data; name="sessionId"\r\n\r\n{self.session_id}\r\n'.encode(),
+                f'--{boundary}\r\nContent-Disposition: form-data; name="widgetId"\r\n\r\n{widget.id}\r\n'.encode(),
+                f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'.encode(),
+                b"Content-Type: application/json\r\n\r\n",
+                data,
+                f"\r\n--{boundary}--\r\n".encode(),
+            ]
+        )
+        request = HTTPRequest(
+            self.url + "/upload_file",
+            method="POST",
+            body=body,
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+        response = await self.http.fetch(request)
+        file_id = int(response.body)
+        state = WidgetState(id=widget.id)
+        state.file_uploader_state_value.CopyFrom(FileUploaderState(max_file_id=file_id))
+        state.file_uploader_state_value.uploaded_file_info.add(id=file_id, name=name, size=len(data))
+        self.values[widget.id] = state
+
+
+# Changes the widgets for one step of the journey and returns the buttons it clicks. "upload session" downloads
+# the session built so far (or uses session_data) and uploads it through the Advanced Options form.
+async def prepare_step(client, step, number, rnd, session_data):
+    if step == "pick ICB":
+        icb = client.widget("ICB Filter:", "selectbox")
+        client.set_value(icb, rnd.randrange(len(icb.options)))
+    elif step == "select all":
+        return [client.widget("Select all", "button").id]
+    elif step == "save place":
+        client.set_value(client.widget("Name your Place", "text_input"), f"Place {number}")
+        return [client.widget("Save Place", "button").id]
+    elif step == "switch year":
+        time_period = client.widget("Time Period:", "selectbox")
+        value = client.values[time_period.id].int_value if time_period.id in client.values else time_period.default
+        client.set_value(time_period, (value + 1) % len(time_period.options))
+    elif step == "advanced options":
+        client.set_value(client.widget("Advanced Options", "checkbox"), True)
+    elif step == "upload session":
+        if session_data is None:
+            session_data = await client.download("Download session data as JSON")
+        await client.upload(client.widget("Upload previous session data as JSON"), "session.json", session_data)
+        return [client.widget("Submit", "button").id]
+    return []
+
+
+# One simulated user: journeys times through the steps, pausing up to twice think seconds between steps. The
+# response time of a step runs from sending the rerun (after any upload) to the end of the script.
+async def run_session(number, args, url, session_data, record):
+    rnd = random.Random(number)
+    client = AppClient(url)
+    await client.connect()
+    try:
+        for journey in range(args.journeys):
+            for step in steps:
+                if step in ("open", "advanced options") and journey > 0:
+                    continue
+                await asyncio.sleep(rnd.uniform(0, 2 * args.think))
+                clicked = await prepare_step(client, step, number * args.journeys + journey, rnd, session_data)
+                started = time.perf_counter()
+                await client.rerun(clicked)
+                finished = time.perf_counter()
+                errors = [body for format, body in client.alerts() if format in ("exception", Alert.ERROR)]
+                if step == "upload session" and not any(
+                    "loaded" in body for _, body in client.alerts(sidebar_only=True)
+                ):
+                    errors.append("no report of the uploaded session")
+                record(step, finished - started, errors)
+    finally:
+        client.close()
+
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Starts `streamlit run` on a free port on localhost, logging to log, and waits for it to answer
+async def start_server(app, log):
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", str(app),
+            "--server.headless=true",
+            f"--server.port={port}",
+            "--server.address=127.0.0.1",
+            "--server.fileWatcherType=none",
+            # the harness posts uploads without the browser's XSRF cookie
+            "--server.enableXsrfProtection=false",
+            "--browser.gatherUsageStats=false",
+        ],
+        cwd=os.path.dirname(os.path.abspath(app)),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    http = AsyncHTTPClient()
+    for _ in range(600):
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited with {server.returncode}, see {log.name}")
+        try:
+            await http.fetch(url + "/healthz")
+            return server, url
+        except (OSError, HTTPClientError):
+            await asyncio.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f"streamlit didn't start in 60 seconds, see {log.name}")
+
+
+# Stops the server and returns its peak RSS in MB
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+# Durations of the stages the dashboard logged (see allocation.StageTimer), from the server's log. Loads on the
+# preload thread (read data) and the first render (which spans the stages before it) aren't stages of a rerun.
+def logged_stages(log_path):
+    stages = {}
+    with open(log_path) as fh:
+        for line in fh:
+            # the server's log format leaves out the logger's name, so the records are found by their first key
+            if '{"stage": ' not in line:
+                continue
+            record = json.loads(line[line.index('{"stage": '):])
+            if record["stage"] not in ("read data", "first render"):
+                stages.setdefault(record["stage"], []).append(record["duration_ms"] / 1000)
+    return stages
+
+
+async def run_load(args, log):
+    server, url = await start_server(args.app, log)
+    session_data = None
+    if args.session:
+        with open(args.session, "rb") as fh:
+            session_data = fh.read()
+
+    timings = {step: [] for step in steps}
+    errors = []
+
+    def record(step, response, step_errors):
+        timings[step].append(response)
+        errors.extend(f"{step}: {error}" for error in step_errors)
+
+    async def session(number):
+        try:
+            await asyncio.wait_for(run_session(number, args, url, session_data, record), args.timeout)
+        except Exception as e:
+            errors.append(f"session {number}: {type(e).__name__}: {e}")
+
+    # the harness's own CPU time is kept too: on a machine with few cores the simulated browsers compete with the
+    # server for it
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        await asyncio.gather(*[session(number) for number in range(args.sessions)])
+    finally:
+        elapsed = time.perf_counter() - start
+        harness_cpu = time.process_time() - cpu_start
+        peak_rss_mb = stop_server(server)
+    return {
+        "elapsed": elapsed,
+        "harness_cpu": harness_cpu,
+        "peak_rss_mb": peak_rss_mb,
+        "timings": timings,
+        "errors": errors,
+    }
+
+
+def percentiles(seconds):
+    if not seconds:
+        return None
+    ms = np.array(seconds) * 1000
+    return {
+        "n": len(ms),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "max_ms": float(ms.max()),
+    }
+
+
+# p50/p95 response time for each step and overall
+def summarise(timings):
+    results = {step: percentiles(timings[step]) for step in steps if timings[step]}
+    results["all"] = percentiles([t for step in steps for t in timings[step]])
+    return results
+
+
+# Steps whose p95 response time, or the server's peak RSS, grew by more than threshold (a fraction) over the baseline
+def regressions(output, baseline, threshold):
+    flagged = []
+    for step, result in output["results"].items():
+        before = baseline.get("results", {}).get(step)
+        if before and result and result["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            flagged.append((f"{step} p95 response", before["p95_ms"], result["p95_ms"], "ms"))
+    before_rss = baseline.get("peak_rss_mb")
+    if before_rss and output["peak_rss_mb"] > before_rss * (1 + threshold):
+        flagged.append(("server peak RSS", before_rss, output["peak_rss_mb"], "MB"))
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("DESCRIPTION:")[1].split("\n")[0].strip())
+    parser.add_argument("-n", "--sessions", type=int, default=10, help="simultaneous sessions")
+    parser.add_argument("-j", "--journeys", type=int, default=2, help="times each session repeats the journey")
+    parser.add_argument("--think", type=float, default=0.5, help="mean pause between a user's steps, in seconds")
+    parser.add_argument("--session", help="session file for the upload step (default: the session built so far)")
+    parser.add_argument("--app", default=APP, help="Streamlit script to run")
+    parser.add_argument("--timeout", type=float, default=600, help="longest a session may take, in seconds")
+    parser.add_argument("-o", "--output", default="session_load_output.json", help="JSON results file")
+    parser.add_argument("-c", "--compare", help="earlier results JSON to flag regressions against")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2, help="growth counted as a regression")
+    parser.add_argument("--log", help="file for the server's log (default: a temporary file)")
+    args = parser.parse_args(argv)
+
+    if not streamlit.__version__.startswith("1.14."):
+        print(
+            f"note: the harness speaks the websocket protocol of Streamlit 1.14 (requirements.txt), "
+            f"this is Streamlit {streamlit.__version__}",
+            file=sys.stderr,
+        )
+
+    with (open(args.log, "w") if args.log else tempfile.NamedTemporaryFile("w", suffix=".log")) as log:
+        run = asyncio.run(run_load(args, log))
+        stages = logged_stages(log.name)
+
+    results = summarise(run["timings"])
+    output = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "sessions": args.sessions,
+        "journeys": args.journeys,
+        "think_s": args.think,
+        "peak_rss_mb": run["peak_rss_mb"],
+        "reruns per second": results["all"]["n"] / run["elapsed"] if results["all"] else 0,
+        "harness cpu share": run["harness_cpu"] / run["elapsed"],
+        "errors": run["errors"],
+        "results": results,
+        "stages": {stage: percentiles(durations) for stage, durations in stages.items()},
+    }
+    with open(args.output, "w") as fh:
+        json.dump(output, fh, indent=4)
+
+    print(f"{args.sessions} sessions, {args.journeys} journeys each, think {args.think}s")
+    print(f"{'step':<18}{'response p50':>14}{'p95':>9}")
+    for step, result in results.items():
+        if result:
+            print(f"{step:<18}{result['p50_ms']:>12.0f}ms{result['p95_ms']:>7.0f}ms")
+    print(f"{'stage':<18}{'p50':>14}{'p95':>9}")
+    for stage, result in output["stages"].items():
+        print(f"{stage:<18}{result['p50_ms']:>12.1f}ms{result['p95_ms']:>7.1f}ms")
+    print(
+        f"server peak RSS {output['peak_rss_mb']:.0f} MB; {output['reruns per second']:.1f} reruns/s; "
+        f"the harness used {output['harness cpu share']:.0%} of a core"
+    )
+    for error in run["errors"][:10]:
+        print(f"ERROR {error}")
+    print(f"results written to {args.output}")
+
+    status = 1 if run["errors"] else 0
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        settings = ["sessions", "journeys", "think_s", "streamlit"]
+        if any(baseline.get(setting) != output[setting] for setting in settings):
+            print(f"note: {args.compare} was run with other settings ({', '.join(settings)})")
+        flagged = regressions(output, baseline, args.threshold)
+        for name, before, after, unit in flagged:
+            print(f"REGRESSION {name}: {before:.0f} {unit} -> {after:.0f} {unit}")
+        status = 1 if flagged else status
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
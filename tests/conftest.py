@@ -0,0 +1,17 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# the repository root, so the tests import the allocation package wherever pytest is run from
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import allocation  # noqa: E402
+
+
+# Every shipped dataset in data/, loaded once for the test run
+@pytest.fixture(scope="session")
+def datasets():
+    return {os.path.basename(path): allocation.load_dataset(path) for path in allocation.dataset_paths()}
@@ -0,0 +1,143 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import allocation
+import api
+from api import parse_request
+
+
+# A session of n places of random practices, each in one of the first ICBs of the dataset
+def random_session(dataset, n, seed):
+    rnd = random.Random(seed)
+    hierarchy = dataset.hierarchy
+    session = {"places": []}
+    for number in range(n):
+        icb = hierarchy.icbs[number % 3]
+        rows = rnd.sample(list(hierarchy.rows[icb]), rnd.randint(1, 20))
+        session["places"].append(f"Place {seed}.{number}")
+        session[f"Place {seed}.{number}"] = {"gps": [hierarchy.display[row] for row in rows], "icb": icb}
+    return session
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture(scope="module")
+def service():
+    return api.PlaceService(allocation.dataset_paths())
+
+
+@pytest.fixture(scope="module")
+def server_url(service):
+    api.PlaceHandler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), api.PlaceHandler)
+    server.verbose = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_request_years():
+    places = [{"place": "P", "icb": "I", "practices": ["A00001"]}]
+    for years, expected in [("2024/2025", ["2024/2025"]), (["2023/2024", "2024_2025"], ["2023/2024", "2024_2025"])]:
+        _, parsed = parse_request(json.dumps({"places": places, "years": years}))
+        assert parsed == expected
+    _, parsed = parse_request(json.dumps(places))
+    assert parsed == []
+
+
+# Years that aren't strings are a bad request (400), not a server error
+@pytest.mark.parametrize("years", [2024, [2024], {"2024/2025": True}, None, ["2024/2025", None]])
+def test_parse_request_rejects_years_that_are_not_strings(years):
+    places = [{"place": "P", "icb": "I", "practices": ["A00001"]}]
+    with pytest.raises(allocation.SessionError):
+        parse_request(json.dumps({"places": places, "years": years}))
+
+
+# Sessions submitted from many threads at once for several years are calculated in one batch, and each gets back
+# its own rows for its own year
+def test_batcher_merges_submissions_and_splits_results(datasets):
+    batcher = allocation.PlaceBatcher(datasets, max_wait=1)
+    requests = [(random_session(dataset, 5, seed), name) for seed in range(4) for name, dataset in datasets.items()]
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        futures = list(executor.map(lambda request: batcher.submit(*request), requests))
+    for (session, name), future in zip(requests, futures):
+        pd.testing.assert_frame_equal(future.result(timeout=10), allocation.compute_places(session, datasets[name]))
+    wait_for(lambda: batcher.batched == len(requests))
+    assert batcher.batches == 1
+
+
+# A session that fails in the worker fails its own request only, not the others in its batch
+def test_batcher_failure_is_limited_to_its_submission(datasets, monkeypatch):
+    assemble_places = allocation.batching.assemble_places
+
+    def fail_bad_place(places, *args):
+        if any(place == "Bad" for place, _, _ in places):
+            raise ValueError("bad place")
+        return assemble_places(places, *args)
+
+    monkeypatch.setattr(allocation.batching, "assemble_places", fail_bad_place)
+    name, dataset = next(iter(datasets.items()))
+    batcher = allocation.PlaceBatcher(datasets, max_wait=1)
+    sessions = [random_session(dataset, 3, seed) for seed in range(3)]
+    bad = random_session(dataset, 1, seed=3)
+    bad["places"], bad["Bad"] = ["Bad"], bad.pop("Place 3.0")
+    futures = [batcher.submit(session, name) for session in [sessions[0], bad] + sessions[1:]]
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=10)
+    for session, future in zip(sessions, futures[:1] + futures[2:]):
+        pd.testing.assert_frame_equal(future.result(timeout=10), allocation.compute_places(session, dataset))
+
+    # and a session with an ICB that isn't in the dataset is refused before it joins a batch
+    unknown = {"places": ["P"], "P": {"gps": [], "icb": "Nope ICB"}}
+    with pytest.raises(allocation.SessionError):
+        batcher.submit(unknown, name)
+
+
+# The service's rows for each year (every year by default) are compute_places with the year in front
+def test_service_places_match_compute_places(service):
+    dataset = next(iter(service.datasets.values()))
+    session = random_session(dataset, 4, seed=0)
+    expected = []
+    for year, year_dataset in service.datasets.items():
+        large_df = allocation.compute_places(session, year_dataset)
+        large_df.insert(loc=0, column="Year", value=year)
+        expected.append(large_df)
+    pd.testing.assert_frame_equal(service.places(session, []), pd.concat(expected, ignore_index=True))
+    year = list(service.datasets)[-1]
+    pd.testing.assert_frame_equal(service.places(session, [year.replace("/", "_")]), expected[-1])
+
+
+def post_places(url, body, query=""):
+    request = urllib.request.Request(f"{url}/places{query}", data=json.dumps(body).encode("utf-8"), method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_unknown_year_is_a_bad_request(service, server_url):
+    dataset = next(iter(service.datasets.values()))
+    session = random_session(dataset, 2, seed=0)
+    status, rows = post_places(server_url, session, "?year=" + list(service.datasets)[0])
+    assert status == 200 and len(rows) == len(allocation.compute_places(session, dataset))
+    status, body = post_places(server_url, session, "?year=1999/2000")
+    assert status == 400 and "1999/2000" in body["error"]
+    status, body = post_places(server_url, dict(session, years=["1999/2000"]))
+    assert status == 400
@@ -0,0 +1,142 @@
+import random
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import allocation
+from allocation.calcs import aggregations, index_names, index_numerator
+
+
+# The dashboard's original calculation (before the batch calculation): query the practices and the ICB of each place,
+# group, divide, and concatenate the ICB and place rows in order of first use of each ICB
+def original_places(session, data):
+    def aggregate(data, query, name, on, aggregations, **variables):
+        df = data.query(query, local_dict=variables)
+        if on not in df.columns:
+            df.insert(loc=0, column=on, value=name)
+        df_group = df.groupby(on).agg(aggregations)
+        df_group = df_group.round(0).astype(int)
+        return df, df_group
+
+    def get_index(place_indices, icb_indices, index_names, index_numerator):
+        icb_indices[index_names] = icb_indices[index_numerator].div(icb_indices["GP pop"].values, axis=0)
+        place_indices[index_names] = (
+            place_indices[index_numerator]
+            .div(place_indices["GP pop"].values, axis=0)
+            .div(icb_indices[index_names].values, axis=0)
+        )
+        return place_indices, icb_indices
+
+    gp_query = "practice_display == @place_state"
+    icb_query = "`ICB name` == @icb_state"
+    dict_obj = {}
+    for place in session["places"]:
+        place_state = session[place]["gps"]
+        icb_state = session[place]["icb"]
+        place_data, place_groupby = aggregate(
+            data, gp_query, place, "Place Name", aggregations, place_state=place_state
+        )
+        icb_data, icb_groupby = aggregate(data, icb_query, icb_state, "ICB name", aggregations, icb_state=icb_state)
+        # a place with no practices in the time period has no row (the original loop failed on one), but its ICB
+        # still has one
+        if place_groupby.empty:
+            icb_indices = get_index(icb_groupby.copy(), icb_groupby, index_names, index_numerator)[1]
+            icb_indices.insert(loc=0, column="Place / ICB", value=icb_state)
+            dict_obj.setdefault(icb_state, [icb_indices])
+            continue
+        place_indices, icb_indices = get_index(place_groupby, icb_groupby, index_names, index_numerator)
+        icb_indices.insert(loc=0, column="Place / ICB", value=icb_state)
+        place_indices.insert(loc=0, column="Place / ICB", value=place)
+        if icb_state not in dict_obj:
+            dict_obj[icb_state] = [icb_indices, place_indices]
+        else:
+            dict_obj[icb_state].append(place_indices)
+    flat_list = [item for sublist in dict_obj.values() for item in sublist]
+    return pd.concat(flat_list, ignore_index=True).round(decimals=3)
+
+
+# The data as the original dashboard read it from the CSV, with text rather than categorical columns
+def original_data(dataset):
+    data = dataset.data.copy()
+    for column in data.select_dtypes("category").columns:
+        data[column] = data[column].astype(object)
+    return data
+
+
+# Random places over a few ICBs (several places sharing an ICB), one with practices from another time period
+# mixed in, one with only practices that aren't in the time period, and one with no practices at all
+def place_session(dataset, seed=0):
+    rnd = random.Random(seed)
+    display = dataset.hierarchy.display
+    icbs = rnd.sample(dataset.hierarchy.icbs, 4)
+    session = {"places": []}
+    for number in range(12):
+        icb = icbs[number % len(icbs)]
+        rows = dataset.hierarchy.rows[icb]
+        chosen = rnd.sample(list(rows), rnd.randint(1, min(len(rows), 30)))
+        session["places"].append(f"Place {number}")
+        session[f"Place {number}"] = {"gps": [display[row] for row in chosen], "icb": icb}
+    missing = ["X99998: Closed Practice", "X99999: Merged Practice"]
+    session["places"] += ["Partly missing", "All missing", "Empty"]
+    session["Partly missing"] = {"gps": session["Place 0"]["gps"] + missing, "icb": session["Place 0"]["icb"]}
+    session["All missing"] = {"gps": missing, "icb": icbs[1]}
+    session["Empty"] = {"gps": [], "icb": icbs[2]}
+    return session
+
+
+def check_equal(large_df, expected):
+    columns = ["Place / ICB"] + list(aggregations) + index_names
+    pd.testing.assert_frame_equal(
+        large_df[columns].reset_index(drop=True), expected[columns].reset_index(drop=True), check_dtype=False
+    )
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_compute_places_matches_original_loop(datasets, seed):
+    for dataset in datasets.values():
+        session = place_session(dataset, seed)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            large_df = allocation.compute_places(session, dataset)
+        check_equal(large_df, original_places(session, original_data(dataset)))
+        places = set(large_df["Place / ICB"])
+        assert "Partly missing" in places
+        assert "All missing" not in places and "Empty" not in places
+
+
+def test_compute_places_through_cache_matches_original_loop(datasets):
+    cache = allocation.PlaceCache()
+    for dataset in datasets.values():
+        session = place_session(dataset)
+        expected = original_places(session, original_data(dataset))
+        # cold, then warm
+        for _ in range(2):
+            check_equal(allocation.compute_places(session, dataset, cache=cache), expected)
+
+
+def test_place_results_empty_place_has_no_index():
+    weights = np.arange(20, dtype=float).reshape(2, 10) + 1
+    icb_index_rows = np.ones((2, len(index_names)))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        place_sums, place_index = allocation.place_results([[0, 1], []], weights, icb_index_rows)
+    assert place_sums[1].sum() == 0
+    assert np.isnan(place_index[1]).all()
+    assert np.allclose(place_index[0], place_sums[0, 1:] / place_sums[0, 0])
+
+
+# Each year of the time period comparison is that year's calculation (a place with no practices in a year has
+# zero population and no index there, where compute_places leaves it out), and the change is from the year before
+def test_compare_places_matches_compute_places_per_year(datasets):
+    stack = allocation.stack_datasets(list(datasets.values()))
+    for dataset in datasets.values():
+        session = place_session(dataset)
+        comparison = allocation.compare_places(session, stack)
+        for year in datasets.values():
+            rows = comparison[(comparison["Year"] == allocation.dataset_year(year.name)) & (comparison["GP pop"] > 0)]
+            check_equal(rows, allocation.compute_places(session, year))
+        for _, rows in comparison.groupby("Place / ICB", sort=False):
+            change = rows[index_names].diff().round(3).to_numpy()
+            np.testing.assert_allclose(rows[[f"{name} change" for name in index_names]], change, atol=0.0015)
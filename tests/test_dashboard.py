@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import session_load_test
+
+
+# Opens the dashboard in one browser tab on a real server (as session_load_test does) and runs steps(client) in it
+def drive_dashboard(steps, log_path):
+    async def run():
+        with open(log_path, "w") as log:
+            server, url = await session_load_test.start_server(session_load_test.APP, log)
+            try:
+                client = session_load_test.AppClient(url)
+                await client.connect()
+                try:
+                    await client.rerun()
+                    await steps(client)
+                finally:
+                    client.close()
+            finally:
+                session_load_test.stop_server(server)
+
+    asyncio.run(run())
+
+
+def exceptions(client):
+    return [body for kind, body in client.alerts() if kind == "exception"]
+
+
+def place_names(client):
+    return list(client.widget("Select Place", "selectbox").options)
+
+
+# A place can't be saved or uploaded under the key of one of the dashboard's widgets (here the result previews'),
+# which would replace the widget's value in the session state and break every rerun of the session
+def test_places_cant_take_widget_keys(tmp_path):
+    async def steps(client):
+        for name in ["places_page", "geographies_filter"]:
+            await client.rerun([client.widget("Select all", "button").id])
+            client.set_value(client.widget("Name your Place", "text_input"), name)
+            await client.rerun([client.widget("Save Place", "button").id])
+            assert any("is used by the tool" in body for _, body in client.alerts(sidebar_only=True))
+            assert name not in place_names(client)
+            await client.rerun()
+            assert not exceptions(client)
+
+        client.set_value(client.widget("Advanced Options", "checkbox"), True)
+        await client.rerun()
+        session = json.loads(await client.download("Download session data as JSON"))
+        session["places"].append(dict(session["places"][0], name="comparison_sort"))
+        uploader = client.widget("Upload previous session data as JSON")
+        await client.upload(uploader, "session.json", json.dumps(session).encode("utf-8"))
+        await client.rerun([client.widget("Submit", "button").id])
+        assert any("comparison_sort" in body for _, body in client.alerts(sidebar_only=True))
+        assert "comparison_sort" not in place_names(client)
+        await client.rerun()
+        assert not exceptions(client)
+
+    drive_dashboard(steps, tmp_path / "server.log")
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+from pyarrow import feather
+
+import allocation
+import session_load_test
+from allocation.data import columnar_path, frame_from_table
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+# Writing into the shared dataset raises rather than changing it for every session
+def test_dataset_is_read_only(datasets):
+    for dataset in datasets.values():
+        with pytest.raises(ValueError):
+            dataset.data.iloc[0, dataset.data.columns.get_loc("GP pop")] = 1
+        with pytest.raises(ValueError):
+            dataset.icb_table.iloc[0, 0] = 1
+        for array in [
+            dataset.practice_index["weights"],
+            dataset.practice_index["lat_long"],
+            dataset.practice_index["codes"],
+            dataset.hierarchy.display,
+            dataset.spatial_index.order,
+        ]:
+            with pytest.raises(ValueError):
+                array[0] = array[1]
+
+
+# The dashboard, recording in the server process the memory Python has allocated after each run and the DataFrames
+# copied during it
+RECORDING_APP = """
+import gc, json, runpy, sys, tracemalloc
+import pandas as pd
+
+sys.path.insert(0, {root!r})
+if not tracemalloc.is_tracing():
+    tracemalloc.start()
+    frame_copy = pd.DataFrame.copy
+
+    def record_copy(self, *args, **kwargs):
+        record_copy.copied.append([*self.shape, int(self.memory_usage(deep=False).sum())])
+        return frame_copy(self, *args, **kwargs)
+
+    pd.DataFrame.copy = record_copy
+pd.DataFrame.copy.copied = []
+try:
+    runpy.run_path({app!r}, run_name="__main__")
+finally:
+    gc.collect()
+    with open({record!r}, "a") as fh:
+        fh.write(json.dumps({{"traced": tracemalloc.get_traced_memory()[0], "copied": pd.DataFrame.copy.copied}}) + "\\n")
+"""
+
+
+# Opens the app in one browser tab after another on a real server (as session_load_test does), returning the runs
+# each tab's first page recorded
+def open_sessions(app, record, tabs):
+    async def run():
+        with open(record.with_suffix(".log"), "w") as log:
+            server, url = await session_load_test.start_server(app, log)
+            try:
+                runs = []
+                for _ in range(tabs):
+                    client = session_load_test.AppClient(url)
+                    await client.connect()
+                    try:
+                        await client.rerun()
+                        assert not [body for kind, body in client.alerts() if kind == "exception"]
+                    finally:
+                        client.close()
+                    lines = record.read_text().splitlines()
+                    runs.append([json.loads(line) for line in lines[sum(map(len, runs)):]])
+                return runs
+            finally:
+                session_load_test.stop_server(server)
+
+    return asyncio.run(run())
+
+
+# A new session's first page keeps much less memory than one copy of the base table, and doesn't copy the table
+# while it runs: the dataset is shared, not copied into each session
+def test_dashboard_session_does_not_copy_dataset(datasets, tmp_path):
+    table_bytes = min(dataset.data.memory_usage(deep=False).sum() for dataset in datasets.values())
+    app, record = tmp_path / "app.py", tmp_path / "runs.jsonl"
+    app.write_text(RECORDING_APP.format(root=str(ROOT), app=session_load_test.APP, record=str(record)))
+
+    # the first session loads the datasets into the process-wide cache
+    loaded, opened = open_sessions(app, record, tabs=2)
+    assert loaded and opened
+    assert opened[-1]["traced"] - loaded[-1]["traced"] < table_bytes / 2
+    assert [copy for run in opened for copy in run["copied"] if copy[2] >= table_bytes / 2] == []
+
+
+# The numeric columns and categorical codes of a dataset read from its Feather copy are views of the memory-mapped
+# file, not copies
+def test_columnar_read_shares_mapped_buffers(datasets):
+    for dataset in datasets.values():
+        table = feather.read_table(columnar_path(dataset.path), memory_map=True)
+        df = frame_from_table(table)
+        for column in list(allocation.aggregations) + ["Latitude", "Longitude", "ICB name"]:
+            chunk = table.column(column).chunk(0)
+            if hasattr(df[column], "cat"):
+                values, buffer = df[column].cat.codes.to_numpy(), chunk.indices.buffers()[1]
+            else:
+                values, buffer = df[column].to_numpy(), chunk.buffers()[1]
+            assert values.__array_interface__["data"][0] == buffer.address + chunk.offset * values.itemsize
+
+        # and loading the dataset keeps them that way: each column's memory belongs to Arrow, not to a numpy copy
+        for column in allocation.aggregations:
+            owner = dataset.data[column].to_numpy()
+            while isinstance(owner, np.ndarray) and owner.base is not None:
+                owner = owner.base
+            assert not isinstance(owner, np.ndarray)
+
+
+# Sessions asking for a dataset at once, preloaded or not, all wait for one load
+def test_preloader_loads_each_dataset_once(monkeypatch):
+    loads = []
+    started = threading.Event()
+
+    def slow_load(path):
+        loads.append(path)
+        started.set()
+        time.sleep(0.2)
+        return object()
+
+    monkeypatch.setattr(allocation.data, "load_dataset", slow_load)
+    preloader = allocation.DatasetPreloader(["preloaded"])
+    started.wait()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for path in ["preloaded", "not preloaded"]:
+            datasets = list(executor.map(preloader.get, [path] * 8))
+            assert all(dataset is datasets[0] for dataset in datasets)
+            assert preloader.get(path) is datasets[0]
+    assert sorted(loads) == ["not preloaded", "preloaded"]
+
+
+# A failed load is raised to every caller waiting for it, and tried again by the next
+def test_preloader_retries_failed_load(monkeypatch):
+    results = [OSError("no such file"), "dataset"]
+
+    def load(path):
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(allocation.data, "load_dataset", load)
+    preloader = allocation.DatasetPreloader([])
+    with pytest.raises(OSError):
+        preloader.get("path")
+    assert preloader.get("path") == "dataset"
@@ -0,0 +1,44 @@
+import random
+
+import numpy as np
+
+import allocation
+from allocation.calcs import aggregations, index_names
+
+
+# Each built-in place is the practices of that ICB with the area's code, and every such practice is in one
+def test_geography_practices_match_data(datasets):
+    for dataset in datasets.values():
+        data, geographies = dataset.data, dataset.geographies
+        table = geographies.table
+        icbs = data["ICB name"].to_numpy(dtype=object)
+        level_codes = {
+            level: data[code_column].to_numpy(dtype=object)
+            for level, (code_column, _) in allocation.geography_levels.items()
+        }
+        found = {level: np.zeros(len(data), dtype=bool) for level in allocation.geography_levels}
+        for (level, icb, label), (position, rows) in geographies.rows.items():
+            assert (table["Level"].iat[position], table["ICB name"].iat[position]) == (level, icb)
+            code = table["Code"].iat[position]
+            assert label.startswith(f"{code}: ")
+            np.testing.assert_array_equal(rows, np.flatnonzero((level_codes[level] == code) & (icbs == icb)))
+            found[level][rows] = True
+        for level, codes in level_codes.items():
+            has_code = np.array([isinstance(code, str) for code in codes], dtype=bool)
+            np.testing.assert_array_equal(found[level], has_code)
+
+
+# A built-in place has the sums and indices of the same practices saved as a place
+def test_geography_table_matches_compute_places(datasets):
+    rnd = random.Random(0)
+    for dataset in datasets.values():
+        geographies, display = dataset.geographies, dataset.hierarchy.display
+        for key in rnd.sample(sorted(geographies.rows), 40):
+            position, rows = geographies.rows[key]
+            session = {"places": ["Area"], "Area": {"gps": [display[row] for row in rows], "icb": key[1]}}
+            large_df = allocation.compute_places(session, dataset)
+            columns = list(aggregations) + index_names
+            np.testing.assert_allclose(
+                geographies.table[columns].to_numpy(dtype=float)[position],
+                large_df[columns].to_numpy(dtype=float)[-1],
+            )
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import allocation
+
+
+def places_table():
+    names = [f"Place {number}" for number in range(45)] + ["Alpha ICB", "Beta ICB"]
+    return pd.DataFrame({"Place / ICB": names, "GP pop": np.arange(len(names))[::-1]})
+
+
+def test_preview_rows_filters_and_sorts():
+    df = places_table()
+    np.testing.assert_array_equal(allocation.preview_rows(df, "icb"), [45, 46])
+    # "Place 1" and "Place 10" to "Place 19", smallest GP pop first
+    np.testing.assert_array_equal(allocation.preview_rows(df, "place 1", "GP pop"), [19, *range(18, 9, -1), 1])
+    np.testing.assert_array_equal(allocation.preview_rows(df, sort_by="GP pop", descending=True), np.arange(len(df)))
+    assert len(allocation.preview_rows(df, "nowhere")) == 0
+
+
+# Paging through every row, then filtering to fewer pages while the page widget keeps its number: the last page
+# of the filtered rows is shown rather than an empty one
+def test_preview_page_clamps_when_filter_shrinks_pages():
+    df = places_table()
+    rows = allocation.preview_rows(df)
+    assert allocation.page_count(len(rows), 10) == 5
+    last_page = [f"Place {number}" for number in range(40, 45)] + ["Alpha ICB", "Beta ICB"]
+    assert list(allocation.preview_page(df, rows, 5, 10)["Place / ICB"]) == last_page
+
+    rows = allocation.preview_rows(df, "place 1")
+    assert allocation.page_count(len(rows), 10) == 2
+    assert allocation.clamp_page(5, len(rows), 10) == 2
+    assert list(allocation.preview_page(df, rows, 5, 10)["Place / ICB"]) == ["Place 19"]
+
+    rows = allocation.preview_rows(df, "nowhere")
+    assert allocation.page_count(len(rows), 10) == 1
+    assert allocation.clamp_page(5, len(rows), 10) == 1
+    assert allocation.preview_page(df, rows, 5, 10).empty
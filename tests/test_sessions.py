@@ -0,0 +1,135 @@
+import gzip
+import json
+
+import pandas as pd
+import pytest
+
+import allocation
+
+
+def uploaded_session(dataset):
+    icb = dataset.hierarchy.icbs[0]
+    gps = [dataset.hierarchy.display[row] for row in dataset.hierarchy.rows[icb][:3]]
+    return json.dumps(
+        {
+            "places": ["Known", "Unknown ICB", "Closed practice"],
+            "Known": {"gps": gps, "icb": icb},
+            "Unknown ICB": {"gps": gps + ["X99999: Nowhere"], "icb": "Nope ICB"},
+            "Closed practice": {"gps": ["X99998: Closed Practice"], "icb": icb},
+        }
+    ).encode("utf-8")
+
+
+# The session in docs/json_format_primer.md (Example 3): the original format, with a "group_list" of places
+def group_list_session():
+    return {
+        "Group 1": {
+            "gps": [
+                "A83005: Whinfield Medical Practice",
+                "A83013: Neasham Road Surgery",
+                "A83034: Blacketts Medical Practice",
+            ],
+            "icb": "Cumbria and North East",
+        },
+        "Group 2": {
+            "gps": ["A83013: Neasham Road Surgery", "A83034: Blacketts Medical Practice"],
+            "icb": "Cumbria and North East",
+        },
+        "group_list": ["Group 1", "Group 2"],
+    }
+
+
+def test_read_session_original_format():
+    session = group_list_session()
+    expected = {"places": ["Group 1", "Group 2"], "Group 1": session["Group 1"], "Group 2": session["Group 2"]}
+    assert allocation.read_session(json.dumps(session).encode("utf-8")) == expected
+
+    # a "places" list, with other (dashboard) keys next to the places left out
+    session["places"] = session.pop("group_list")
+    session["before"] = session["after"] = 0
+    assert allocation.read_session(json.dumps(session).encode("utf-8")) == expected
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_read_session_compact_format(compress):
+    data = json.dumps(
+        {
+            "version": allocation.SESSION_VERSION,
+            "places": [{"name": "Group 2", "icb": "Cumbria and North East", "gps": ["A83013", "A83034"]}],
+        }
+    ).encode("utf-8")
+    expected = {"places": ["Group 2"], "Group 2": {"gps": ["A83013", "A83034"], "icb": "Cumbria and North East"}}
+    assert allocation.read_session(gzip.compress(data) if compress else data) == expected
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"\x1f\x8b not gzip",
+        b"{not json",
+        b"[]",
+        b'{"version": 1, "places": []}',
+        b'{"version": 2, "places": [{"icb": "X"}]}',
+        b'{"places": ["A"]}',
+        b'{"places": ["A"], "A": {"gps": "A83005", "icb": "X"}}',
+        b'{"places": ["A", "A"], "A": {"gps": [], "icb": "X"}}',
+    ],
+)
+def test_read_session_refuses_malformed_files(data):
+    with pytest.raises(allocation.SessionError):
+        allocation.read_session(data)
+
+
+# Saving a session and loading it back gives the same places, with the same practices (as practice codes) and ICBs,
+# compressed or not
+@pytest.mark.parametrize("compress", [False, True])
+def test_dump_session_roundtrip(datasets, compress):
+    for dataset in datasets.values():
+        session = allocation.read_session(uploaded_session(dataset))
+        data = allocation.dump_session(session, compress=compress)
+        assert (data[:2] == b"\x1f\x8b") == compress
+        loaded = allocation.read_session(data)
+        assert loaded["places"] == session["places"]
+        for place in session["places"]:
+            assert loaded[place]["icb"] == session[place]["icb"]
+            assert loaded[place]["gps"] == [allocation.practice_code(gp) for gp in session[place]["gps"]]
+        # and calculates to the same places
+        pd.testing.assert_frame_equal(
+            allocation.compute_places(allocation.resolve_session(loaded, dataset).session, dataset),
+            allocation.compute_places(allocation.resolve_session(session, dataset).session, dataset),
+        )
+
+
+# A place whose ICB isn't in the time period is reported and left out, so the session can be calculated
+def test_resolve_session_leaves_out_places_with_unknown_icbs(datasets):
+    for dataset in datasets.values():
+        report = allocation.resolve_session(allocation.read_session(uploaded_session(dataset)), dataset)
+        assert report.session["places"] == ["Known", "Closed practice"]
+        assert "Unknown ICB" not in report.session
+        assert report.unknown_icbs == [("Unknown ICB", "Nope ICB")]
+        # the left out place's practices aren't reported as well
+        assert report.unknown == [("Closed practice", "X99998: Closed Practice")]
+        assert report.practices == 4
+        assert not report.ok
+        assert "places not loaded" in report.summary()
+
+        # as the dashboard does after loading the file
+        large_df = allocation.SessionResults().update(report.session, dataset)
+        assert list(large_df["Place / ICB"]) == [dataset.hierarchy.icbs[0], "Known"]
+
+
+def test_resolve_session_every_icb_unknown(datasets):
+    dataset = next(iter(datasets.values()))
+    session = {"places": ["P"], "P": {"gps": [], "icb": "Nope ICB"}}
+    report = allocation.resolve_session(session, dataset)
+    assert report.session == {"places": []}
+    assert report.unknown_icbs == [("P", "Nope ICB")]
+
+
+def test_without_places():
+    session = {"places": ["A", "after", "B"], "A": {"gps": [], "icb": "X"}, "after": {}, "B": {"gps": [], "icb": "Y"}}
+    assert allocation.without_places(session, ["after"]) == {
+        "places": ["A", "B"],
+        "A": {"gps": [], "icb": "X"},
+        "B": {"gps": [], "icb": "Y"},
+    }
@@ -0,0 +1,76 @@
+import numpy as np
+
+import allocation
+from allocation.spatial import build_spatial_index, distance_km
+
+
+def random_points(dataset, n, seed):
+    rnd = np.random.default_rng(seed)
+    lat_long = dataset.spatial_index.lat_long
+    south, west = np.nanmin(lat_long, axis=0)
+    north, east = np.nanmax(lat_long, axis=0)
+    return np.column_stack([rnd.uniform(south, north, n), rnd.uniform(west, east, n)]), rnd
+
+
+# The grid index finds the same practices as measuring the distance to every practice
+def test_practices_within_matches_brute_force(datasets):
+    for dataset in datasets.values():
+        index = dataset.spatial_index
+        points, rnd = random_points(dataset, 50, seed=0)
+        for (latitude, longitude), radius_km in zip(points, rnd.uniform(0.5, 60, len(points))):
+            expected = np.flatnonzero(distance_km(index.lat_long, latitude, longitude) <= radius_km)
+            found = allocation.practices_within(index, latitude, longitude, radius_km)
+            np.testing.assert_array_equal(found, expected)
+
+
+def test_nearest_practices_matches_brute_force(datasets):
+    for dataset in datasets.values():
+        index = dataset.spatial_index
+        icb_rows = dataset.hierarchy.rows[dataset.hierarchy.icbs[0]]
+        allowed = np.zeros(len(index.lat_long), dtype=bool)
+        allowed[icb_rows] = True
+        points, rnd = random_points(dataset, 50, seed=1)
+        for (latitude, longitude), k in zip(points, rnd.integers(1, 30, len(points))):
+            distances = distance_km(index.lat_long, latitude, longitude)
+            rows, found = allocation.nearest_practices(index, latitude, longitude, k)
+            np.testing.assert_allclose(found, np.sort(distances)[:k])
+            np.testing.assert_allclose(distances[rows], found)
+
+            rows, found = allocation.nearest_practices(index, latitude, longitude, k, allowed=allowed)
+            assert allowed[rows].all()
+            np.testing.assert_allclose(found, np.sort(distances[icb_rows])[:k])
+
+
+# [longitude, latitude] corners of a box around a point
+def box(latitude, longitude, half_height, half_width):
+    return [
+        [longitude - half_width, latitude - half_height],
+        [longitude + half_width, latitude - half_height],
+        [longitude + half_width, latitude + half_height],
+        [longitude - half_width, latitude + half_height],
+    ]
+
+
+# A box with a box-shaped hole, so whether a practice is inside is a comparison of its coordinates
+def test_practices_in_polygon_with_hole(datasets):
+    for dataset in datasets.values():
+        index = dataset.spatial_index
+        latitude, longitude = np.nanmedian(index.lat_long, axis=0)
+        rings = [box(latitude, longitude, 0.5, 1), box(latitude, longitude, 0.2, 0.3)]
+        geojson = {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": rings}}
+
+        lat, long = index.lat_long[:, 0], index.lat_long[:, 1]
+        in_outline = (abs(lat - latitude) < 0.5) & (abs(long - longitude) < 1)
+        in_hole = (abs(lat - latitude) < 0.2) & (abs(long - longitude) < 0.3)
+        expected = np.flatnonzero(in_outline & ~in_hole)
+        assert len(expected) and in_hole.any()
+        np.testing.assert_array_equal(allocation.practices_in_polygon(index, geojson), expected)
+
+
+# Practices without coordinates aren't indexed, and aren't found
+def test_spatial_index_skips_missing_coordinates():
+    lat_long = np.array([[52.0, 0.0], [np.nan, np.nan], [52.01, 0.01], [53.0, 1.0]])
+    index = build_spatial_index(lat_long)
+    np.testing.assert_array_equal(allocation.practices_within(index, 52.0, 0.0, 5), [0, 2])
+    rows, _ = allocation.nearest_practices(index, 52.0, 0.0, 10)
+    np.testing.assert_array_equal(rows, [0, 2, 3])
@@ -0,0 +1,27 @@
+import allocation
+
+
+# Saving a what-if applies only its additions and removals, so practices of the place that aren't in the dataset
+# (e.g. closed before this Time Period) are kept
+def test_what_if_apply_keeps_practices_not_in_dataset(datasets):
+    for dataset in datasets.values():
+        icb = dataset.hierarchy.icbs[0]
+        rows = list(dataset.hierarchy.rows[icb][:4])
+        codes = dataset.practice_index["codes"]
+        gps = ["X99999", dataset.hierarchy.display[rows[0]], codes[rows[1]], codes[rows[2]]]
+
+        what_if = allocation.WhatIf.from_place(dataset, gps, icb)
+        assert what_if.members == set(rows[:3])
+        what_if.toggle(rows[1])
+        what_if.toggle(rows[3])
+        assert what_if.apply(dataset.practice_index, gps) == [
+            "X99999",
+            dataset.hierarchy.display[rows[0]],
+            codes[rows[2]],
+            codes[rows[3]],
+        ]
+
+        # toggled back, nothing changes
+        what_if.toggle(rows[1])
+        what_if.toggle(rows[3])
+        assert what_if.apply(dataset.practice_index, gps) == gps
@@ -1,65 +1,194 @@
+import html
+import json
+import os
+import threading
+import time
+
 import streamlit as st
-from st_aggrid import AgGrid
-
-import pandas as pd
-
-# Load data and cache
-@st.cache()  # use Streamlit cache decorator to cache this operation so data doesn't have to be read in everytime script is re-run
-def get_data(path):
-    print('cache miss')
-    df = pd.read_csv(path)
-    df = df.rename(
-        columns={
-            "Practice_Code": "GP Practice code",
-            "GP_Practice_Name": "GP Practice name",
-            "Practice_Postcode": "GP Practice postcode",
-            "CCG21": "CCG code",
-            "Former CCG": "CCG name",
-            "PCN_Code": "PCN code",
-            "PCN_Name": "PCN name",
-            "LOC22": "Location code",
-            "LOC22name": "Location name",
-            "ICS22": "ICB code",
-            "ICS22name": "ICB name",
-            "R22": "Region code",
-            "Region22": "Region name",
-            "LAD21": "LA District code",
-            "LTLA21": "LA District name",
-            "LA21": "LA code",
-            "UTLA21": "LA name",
-            "Patients": "Registered Patients",
-            "pop 2022/23": "GP pop",
-            "G&A WP": "Weighted G&A pop",
-            "CS WP": "Weighted Community pop",
-            "MH WP": "Weighted Mental Health pop",
-            "Mat WP": "Weighted Maternity pop",
-            "Health Ineq WP": "Weighted Health Inequalities pop",
-            "Prescr WP": "Weighted Prescribing pop",
-            "Final WP": "Overall Weighted pop",
-            "Primary Medical Care WP": "Weighted Primary Medical Care Need",
-            "Final PMC WP": "Weighted Primary Care",
-            
-
-        }
+
+import allocation
+
+# Shared and memoised caches: st.cache_resource / st.cache_data replace the experimental decorators from Streamlit
+# 1.18, which then warn on every rerun (and break set_page_config), so the newer names are used when available
+cache_resource = getattr(st, "cache_resource", None) or st.experimental_singleton
+cache_data = getattr(st, "cache_data", None) or st.experimental_memo
+
+# The result previews (see write_preview) and their widgets, keyed "<preview>_<widget>"
+preview_names = ["places", "comparison", "geographies"]
+preview_widgets = ["filter", "sort", "order", "page_size", "page"]
+
+
+def preview_key(preview, widget):
+    return f"{preview}_{widget}"
+
+
+# Places are kept in the session state under their own names (with "places" listing them), so the dashboard's own
+# state is kept in one dict under TOOL_STATE, and a place can't take the name of a session state key the
+# dashboard uses (its widget keys have to be in the session state itself)
+TOOL_STATE = "_tool_state"
+reserved_names = {"places", "before", "after", "multiselect_contents", "what_if_practice", TOOL_STATE} | {
+    preview_key(preview, widget) for preview in preview_names for widget in preview_widgets
+}
+
+
+def tool_state():
+    if TOOL_STATE not in st.session_state:
+        st.session_state[TOOL_STATE] = {}
+    return st.session_state[TOOL_STATE]
+
+
+# Time series files in data/, in the order offered in the Time Period list
+def dataset_files():
+    return [f for f in os.listdir(allocation.DATA_DIR) if f.endswith(".csv")]
+
+
+def dataset_path(file_name):
+    return os.path.join(allocation.DATA_DIR, file_name)
+
+
+# Every dataset is loaded and indexed on a background thread as soon as the app is first imported by the server,
+# so the first session and the first switch of Time Period don't parse the data themselves
+preloader = allocation.DatasetPreloader([dataset_path(f) for f in dataset_files()])
+
+# How the last get_dataset call in this thread (i.e. this session's rerun) got the dataset: "hit" (already cached),
+# "preload" (from the preloader's load, waiting for it if it's under way) or "miss" (loaded in this rerun)
+dataset_loads = threading.local()
+
+
+# Load data and its lookups once per dataset, shared by every session
+@cache_resource
+def load_dataset(path):
+    dataset_loads.status = "preload" if preloader.preloaded(path) else "miss"
+    return preloader.get(path)
+
+
+def get_dataset(path):
+    dataset_loads.status = "hit"
+    return load_dataset(path)
+
+
+def dataset_cache_status():
+    return getattr(dataset_loads, "status", "hit")
+
+
+# Time from the start of the first rerun in this process (script_started, from the top of dashboard.py) to the end
+# of its render, logged once per process
+first_render = {}
+first_render_lock = threading.Lock()
+
+
+def log_first_render(script_started):
+    with first_render_lock:
+        if not first_render:
+            first_render["duration"] = time.perf_counter() - script_started
+            allocation.log_stage("first render", first_render["duration"])
+    return first_render["duration"]
+
+
+# Download file for the selected format only, built once per distinct result: the results are fully determined by
+# the dataset contents, the session and whether time periods are compared, so the frames themselves aren't hashed
+@cache_data(max_entries=32)
+def get_export(
+    export_format, content_hash, dataset_name, session_dump, compare_years, _large_df, _icbs, _comparison_df
+):
+    return allocation.build_export(
+        export_format, _large_df, set(_icbs), dataset_name, session_dump, _comparison_df
     )
-    df = df.fillna(1).replace(0, 1)
-    df["practice_display"] = df["GP Practice code"] + ": " + df["GP Practice name"]
-    return df
+
+
+# CSV of every built-in place of a dataset, built once per dataset
+@cache_data(max_entries=8)
+def get_geography_csv(content_hash, _table):
+    return allocation.convert_df(_table)
+
+
+# One practice marker (the same icon as folium.Icon(color="darkblue", icon="fa-user-md", prefix="fa")),
+# created in the browser from a [latitude, longitude, popup] row of the FastMarkerCluster data
+marker_callback = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon(
+        {markerColor: "darkblue", iconColor: "white", icon: "fa-user-md", prefix: "fa"}
+    );
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+# Rendered HTML of the map of a place, with every practice in one marker cluster layer built from the coordinate
+# array. Cached per dataset and practice set, so it is only rebuilt when the place's practices change.
+# practices are display strings that are all in the dataset.
+@cache_data(max_entries=64)
+def get_map_html(content_hash, practices, _practice_index):
+    # folium is slow to import, so it is only imported once a map is drawn
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    rows = [_practice_index["display"][gp] for gp in practices]
+    lat_long = _practice_index["lat_long"][rows]
+    map = folium.Map(location=[52, 0], zoom_start=10, tiles="openstreetmap")
+    popups = [html.escape(gp) for gp in practices]
+    FastMarkerCluster(
+        data=[[latitude, longitude, popup] for (latitude, longitude), popup in zip(lat_long.tolist(), popups)],
+        callback=marker_callback,
+    ).add_to(map)
+    # bounds method https://stackoverflow.com/a/58185815
+    (south, west), (north, east) = lat_long.min(axis=0), lat_long.max(axis=0)
+    map.fit_bounds([[south - 0.02, west], [north + 0.02, east]])  # add buffer to north
+    return folium.Figure().add_child(map).render()
+
+
+# Every dataset aligned on practice code for the time period comparison
+@cache_resource
+def get_year_stack(paths):
+    return allocation.stack_datasets([get_dataset(path) for path in paths])
 
 
 # Store defined places in a list to access them later for place based calculations
-@st.cache(allow_output_mutation=True)
+@cache_resource
 def store_data():
     return []
 
 
-# Sidebar dropdown list
-@st.cache
-def get_sidebar(data):
-    icb = data["ICB name"].unique().tolist()
-    icb.sort()
-    return icb
+# AgGrid settings of a result table, built once per result (result_key, e.g. the dataset hash and the session).
+# Sorting and filtering happen on the server (see write_preview), so they are turned off in the grid.
+@cache_data(max_entries=32)
+def get_grid_options(result_key, _df):
+    from st_aggrid import GridOptionsBuilder
+
+    builder = GridOptionsBuilder.from_dataframe(_df.head(0))
+    builder.configure_default_column(sortable=False, filterable=False, suppressMenu=True)
+    # plain dicts (the builder uses defaultdicts), so the options can be memoised
+    return json.loads(json.dumps(builder.build()))
 
 
-def write_table(data):
-    return AgGrid(data)
+# Positions of the rows matching the preview filter, in the chosen order, cached per result and settings
+@cache_data(max_entries=64)
+def get_preview_rows(result_key, text, sort_by, descending, _df):
+    return allocation.preview_rows(_df, text, sort_by, descending)
+
+
+# Paginated preview of a result table: filtering, sorting and paging are done here and only the rows of the page
+# shown are sent to the grid. key (one of preview_names) keeps the widgets of several previews apart.
+def write_preview(df, key, result_key):
+    from st_aggrid import AgGrid, GridUpdateMode
+
+    keys = {widget: preview_key(key, widget) for widget in preview_widgets}
+    cols = st.columns([3, 3, 2, 2])
+    text = cols[0].text_input("Filter", key=keys["filter"], help="Show rows containing this text")
+    sort_by = cols[1].selectbox("Sort by", ["Table order"] + list(df.columns), key=keys["sort"])
+    descending = cols[2].selectbox("Order", ["Ascending", "Descending"], key=keys["order"]) == "Descending"
+    page_size = cols[3].selectbox("Rows per page", [10, 25, 50, 100], index=1, key=keys["page_size"])
+
+    rows = get_preview_rows(result_key, text, None if sort_by == "Table order" else sort_by, descending, df)
+    pages = allocation.page_count(len(rows), page_size)
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=keys["page"])
+    page = allocation.clamp_page(page, len(rows), page_size)
+    AgGrid(
+        allocation.preview_page(df, rows, page, page_size),
+        gridOptions=get_grid_options(result_key, df),
+        update_mode=GridUpdateMode.NO_UPDATE,
+    )
+    first = (page - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(rows))} to {min(first + page_size, len(rows))} of {len(rows)}")